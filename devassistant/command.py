@@ -4,6 +4,7 @@ import string
 
 from devassistant import exceptions
 from devassistant.logger import logger
+from devassistant import package_managers
 from devassistant import utils
 
 class Command(object):
@@ -11,6 +12,10 @@ class Command(object):
     _lang = None
     # spliting strings by _command_splitter.findall(str) preserves whitespace
     _command_splitter = re.compile(r'(\s+|\S+)')
+    # commands that can't need dependencies collected by the run-scoped DependencyInstaller;
+    # all other commands are barriers - pending dependencies are installed before they run
+    _no_barrier_types = ['call', 'use', 'dda_r', 'dda_dependencies']
+    _no_barrier_prefixes = ('dependencies', 'log_')
 
     def __init__(self, comm_type, comm, kwargs={}):
         self.comm_type = comm_type
@@ -20,9 +25,14 @@ class Command(object):
         self.kwargs = kwargs
 
     def run(self):
+        if self.is_barrier():
+            package_managers.DependencyInstaller.flush_pending()
         if not type(self)._command_runners:
             # avoid circular dependency between this module and command_runners
             type(self)._command_runners = utils.import_module('devassistant.command_runners')
+        if not self.comm_type.startswith('dda_'):
+            # commands may read .devassistant files, so write out pending changes first
+            type(self)._command_runners.DotDevassistantCommandRunner.sync()
         for cr in type(self)._command_runners.command_runners:
             if cr.matches(self):
                 return cr.run(self) 
@@ -31,6 +41,13 @@ class Command(object):
                 format(ct=self.comm_type,
                        c=self.comm))
 
+    def is_barrier(self):
+        """Returns True if dependencies pending installation must be installed before
+        running this command (see DependencyInstaller.start_aggregating).
+        """
+        return not (self.comm_type in self._no_barrier_types or
+                    self.comm_type.startswith(self._no_barrier_prefixes))
+
     def format_str(self):
         """Formats input of this command as a string."""
         return self._format_str(s=self.comm)
@@ -6,12 +6,21 @@ import os
 import signal
 import subprocess
 import sys
+import uuid
+try:
+    from shlex import quote
+except ImportError: # Python 2
+    from pipes import quote
 
 from devassistant import current_run
 from devassistant import exceptions
 from devassistant.logger import logger
 
 class ClHelper(object):
+    # persistent shells for scl stacks that are currently enabled by "scl" command,
+    # {('enable', 'foo', 'bar'): SCLShell}
+    scl_shells = {}
+
     @classmethod
     def run_command(cls,
                     cmd_str,
@@ -27,6 +36,9 @@ class ClHelper(object):
             ignore_sigint: should we ignore sigint during this command (False by default)
             output_callback: function that gets called with every line of output as argument
         """
+        if cls._can_use_scl_shell(cmd_str, scls, ignore_sigint):
+            return cls._run_in_scl_shell(cmd_str, log_level, scls, output_callback)
+
         # format for scl execution if needed
         cmd_str = cls.format_for_scls(cmd_str, scls)
         logger.log(log_level, cmd_str, extra={'event_type': 'cmd_call'})
@@ -85,6 +97,60 @@ class ClHelper(object):
                                          proc.returncode,
                                          stdout)
 
+    @classmethod
+    def _can_use_scl_shell(cls, cmd_str, scls, ignore_sigint):
+        """Returns True if given command can be run in a persistent shell opened by
+        open_scl_shell for given scls. Commands that must ignore sigint are always run
+        in a separate process, same as "cd", which needs to change our own working directory.
+        """
+        return bool(scls) and tuple(scls) in cls.scl_shells and \
+            not ignore_sigint and not cmd_str.startswith('cd ')
+
+    @classmethod
+    def _run_in_scl_shell(cls, cmd_str, log_level, scls, output_callback):
+        logger.log(log_level, cmd_str, extra={'event_type': 'cmd_call'})
+
+        def process_line(line):
+            logger.log(log_level, line, extra={'event_type': 'cmd_out'})
+            if output_callback:
+                output_callback(line)
+
+        returncode, stdout = cls.scl_shells[tuple(scls)].run(cmd_str, process_line)
+        stdout = '\n'.join(stdout).strip()
+
+        # log return code always on debug level
+        logger.log(logging.DEBUG, returncode, extra={'event_type': 'cmd_retcode'})
+
+        if returncode == 0:
+            return stdout
+        else:
+            raise exceptions.ClException(cmd_str,
+                                         returncode,
+                                         stdout)
+
+    @classmethod
+    def open_scl_shell(cls, scls):
+        """Makes all subsequent commands with given scls run in one persistent shell
+        (the shell process itself is started lazily, when first command needs it).
+        Every call must be paired with close_scl_shell.
+        """
+        key = tuple(scls)
+        if key not in cls.scl_shells:
+            cls.scl_shells[key] = SCLShell(scls)
+        cls.scl_shells[key].users += 1
+
+    @classmethod
+    def close_scl_shell(cls, scls):
+        """Terminates the persistent shell for given scls, if nobody else uses it."""
+        key = tuple(scls)
+        shell = cls.scl_shells.get(key, None)
+        if shell is None:
+            return
+        shell.users -= 1
+        if shell.users <= 0:
+            del cls.scl_shells[key]
+            shell.close()
+
     @classmethod
     def format_for_scls(cls, cmd_str, scls):
         if scls and not cmd_str.startswith('cd '):
@@ -96,6 +162,87 @@ class ClHelper(object):
     def ignore_sigint(cls):
         signal.signal(signal.SIGINT, signal.SIG_IGN)
 
+class SCLShell(object):
+    """A shell running in environment of given software collections, that executes
+    commands sent to its stdin one by one. This saves starting scl and sourcing enable
+    scriptlets of all collections for every single command.
+
+    Every command is run in a subshell (so that "exit" or "cd" in it don't affect other
+    commands) in current working directory of DevAssistant. After the command finishes,
+    the shell prints a unique marker followed by the command's return code.
+    """
+    c_scl = 'scl'
+    c_shell = 'bash'
+
+    def __init__(self, scls):
+        self.scls = scls
+        self.users = 0
+        self.proc = None
+        self.marker = 'DA_SCL_DONE_{0}'.format(uuid.uuid4().hex)
+
+    def get_shell_cmd(self):
+        return ' '.join([self.c_scl] + list(self.scls) + [self.c_shell])
+
+    def _start(self):
+        self.proc = subprocess.Popen(self.get_shell_cmd(),
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.STDOUT,
+                                     shell=True)
+
+    def is_running(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def run(self, cmd_str, line_callback=None):
+        """Runs given command in this shell.
+
+        Args:
+            cmd_str: the command to run as string
+            line_callback: function that gets called with every (stripped) line of output
+        Returns:
+            tuple (returncode, list of output lines)
+        """
+        if not self.is_running():
+            self._start()
+        # the command is eval-ed, so that its syntax errors (e.g. unbalanced quotes)
+        # don't make the shell read the following lines (including the marker) as its part
+        script = 'cd {cwd} && ( eval {cmd} ) </dev/null 2>&1; printf "%s %d\\n" {marker} $?\n'.\
+            format(cwd=quote(os.getcwd()), cmd=quote(cmd_str), marker=self.marker)
+
+        output = []
+        def add_line(line):
+            line = line.strip()
+            output.append(line)
+            if line_callback:
+                line_callback(line)
+
+        try:
+            self.proc.stdin.write(script.encode('utf8'))
+            self.proc.stdin.flush()
+        except (IOError, OSError):
+            pass # shell has died, the rest is handled below when reading its output
+
+        while True:
+            line = self.proc.stdout.readline().decode('utf8')
+            if not line:
+                # the shell itself has terminated (e.g. scl is not installed)
+                self.proc.wait()
+                return self.proc.returncode or 1, output
+            pos = line.find(self.marker)
+            if pos == -1:
+                add_line(line)
+            else:
+                # the last line of command output may not end with newline
+                if line[:pos]:
+                    add_line(line[:pos])
+                return int(line[pos + len(self.marker):]), output
+
+    def close(self):
+        if self.is_running():
+            self.proc.stdin.close()
+            self.proc.wait()
+        self.proc = None
+
 class PathHelper(object):
     c_cp = 'cp'
     c_mkdir = 'mkdir'
@@ -1,23 +1,34 @@
 import copy
 import functools
 import getpass
+import glob
 import logging
 import os
+import shutil
+import time
+from multiprocessing.pool import ThreadPool
 
 import jinja2
 import yaml
+try:
+    from yaml import CDumper as Dumper
+except ImportError:
+    from yaml import Dumper
 
 import devassistant
 
 from devassistant import exceptions
 from devassistant import command
+from devassistant import current_run
 from devassistant.remote_auth import GitHubAuth
 from devassistant.command_helpers import ClHelper, DialogHelper
+from devassistant.generation_cache import GenerationCache
 from devassistant import lang
 from devassistant.logger import logger
 from devassistant.package_managers import DependencyInstaller
 from devassistant import settings
 from devassistant import utils
+from devassistant.yaml_loader import Loader
 from devassistant import yaml_snippet_loader
 
 command_runners = []
@@ -106,6 +117,7 @@ class CallCommandRunner(CommandRunner):
             c.kwargs['__files__'].append(snippet.get_files_section())
             c.kwargs['__files_dir__'].append(snippet.get_files_dir())
             c.kwargs['__sourcefiles__'].append(snippet.path)
+            GenerationCache.add_sourcefile(snippet.path, snippet.get_files_dir())
 
         if sect_type == 'dependencies':
             result = lang.dependencies_section(section, copy.deepcopy(c.kwargs), runner=assistant)
@@ -153,15 +165,14 @@ class CallCommandRunner(CommandRunner):
         section = sourcefile = None
 
         if call_parts[0] == 'self':
-            section = getattr(assistant, '_' + section_name, None)
+            section = assistant.get_section(section_name)
             sourcefile = assistant.path
         elif call_parts[0] == 'super':
             a = assistant.superassistant
             while a:
-                if hasattr(a, 'assert_fully_loaded'):
-                    a.assert_fully_loaded()
-                if hasattr(a, '_' + section_name):
-                    section = getattr(a, '_' + section_name)
+                if hasattr(a, 'get_section'):
+                    section = a.get_section(section_name)
+                if section is not None:
                     sourcefile = a.path
                     break
                 a = a.superassistant
@@ -198,6 +209,83 @@ class ClCommandRunner(CommandRunner):
 
         return [True, result]
 
+@register_command_runner
+class CopyFilesCommandRunner(CommandRunner):
+    # number of threads copying files in parallel
+    pool_size = 8
+
+    @classmethod
+    def matches(cls, c):
+        return c.comm_type == 'copy_files'
+
+    @classmethod
+    def _get_sources(cls, files, files_dir):
+        """Returns paths of files to copy given as a list (or one) of references to files
+        section, paths or globs relative to files_dir.
+        """
+        if not isinstance(files, list):
+            files = [files]
+        sources = []
+        for f in files:
+            if isinstance(f, dict) and 'source' in f:
+                f = f['source']
+            if not isinstance(f, str):
+                raise exceptions.CommandException('Wrong file to copy: {0}'.format(f))
+            path = os.path.join(files_dir, f)
+            if glob.has_magic(path):
+                sources.extend(sorted(glob.glob(path)))
+            elif os.path.exists(path):
+                sources.append(path)
+            else:
+                raise exceptions.CommandException('File to copy doesn\'t exist: {0}'.format(f))
+        return sources
+
+    @classmethod
+    def run(cls, c):
+        args = c.format_deep()
+        if not isinstance(args, dict) or 'files' not in args or 'destination' not in args:
+            msg = 'copy_files needs a mapping with "files" and "destination", got {0}'.\
+                format(args)
+            raise exceptions.CommandException(msg)
+        destination = args['destination']
+        overwrite = args.get('overwrite', False) in [True, 'True', 'true', 'yes']
+
+        # list of (source file, destination file); directories are copied recursively
+        jobs = []
+        for source in cls._get_sources(args['files'], c.files_dir):
+            target = os.path.join(destination, os.path.basename(source.rstrip(os.sep)))
+            if os.path.isdir(source):
+                for dirpath, dirnames, filenames in os.walk(source):
+                    for f in filenames:
+                        path = os.path.join(dirpath, f)
+                        jobs.append((path, os.path.join(target, os.path.relpath(path, source))))
+            else:
+                jobs.append((source, target))
+
+        # check all destinations and create all directories before copying anything
+        if not overwrite:
+            for _, target in jobs:
+                if os.path.exists(target):
+                    msg = 'The destination file already exists: {0}'.format(target)
+                    raise exceptions.CommandException(msg)
+        for d in sorted(set([os.path.dirname(target) for _, target in jobs])):
+            if d and not os.path.isdir(d):
+                os.makedirs(d)
+
+        start = time.time()
+        pool = ThreadPool(cls.pool_size)
+        try:
+            pool.map(lambda job: utils.copy_file(*job), jobs)
+        except (IOError, OSError) as e:
+            raise exceptions.CommandException('Failed to copy files: {0}'.format(e))
+        finally:
+            pool.close()
+            pool.join()
+        logger.debug('Copied {0} files to {1} in {2:.2f}s'.format(len(jobs), destination,
+                                                                 time.time() - start))
+
+        return [True, 'success']
+
 @register_command_runner
 class DependenciesCommandRunner(CommandRunner):
     @classmethod
@@ -211,12 +299,20 @@ class DependenciesCommandRunner(CommandRunner):
             msg = 'Dependencies for installation must be list, got {v}.'.format(v=struct)
             raise exceptions.CommandException(msg)
 
-        di = DependencyInstaller()
-        di.install(struct)
+        if DependencyInstaller.pending is not None:
+            # aggregating dependencies of whole run, they'll get installed at next barrier
+            DependencyInstaller.pending.add(struct)
+        else:
+            DependencyInstaller().install(struct)
         return [True, struct]
 
 @register_command_runner
 class DotDevassistantCommandRunner(CommandRunner):
+    # contents of .devassistant files - {path: [content, (mtime, size) of file on disk]}
+    _documents = {}
+    # paths of .devassistant files modified since last sync
+    _dirty = set()
+
     @classmethod
     def matches(cls, c):
         return c.comm_type.startswith('dda_')
@@ -251,24 +347,65 @@ class DotDevassistantCommandRunner(CommandRunner):
 
         return comm
 
+    @classmethod
+    def _dda_path(cls, directory):
+        return os.path.join(os.path.abspath(os.path.expanduser(directory)), '.devassistant')
+
+    @classmethod
+    def _get_document(cls, directory):
+        """Returns content of .devassistant file in given directory. Every file is only
+        parsed again if it changed on disk since it was last read or written.
+        """
+        dda_path = cls._dda_path(directory)
+        if dda_path not in cls._dirty:
+            try:
+                st = os.stat(dda_path)
+                if cls._documents.get(dda_path, [None, None])[1] != (st.st_mtime, st.st_size):
+                    with open(dda_path, 'r') as stream:
+                        cls._documents[dda_path] = [yaml.load(stream, Loader=Loader),
+                                                    (st.st_mtime, st.st_size)]
+            except (IOError, OSError) as e:
+                cls._documents.pop(dda_path, None)
+                msg = 'Couldn\'t find/open/read .devassistant file: {0}'.format(e)
+                raise exceptions.CommandException(msg)
+        return cls._documents[dda_path][0]
+
     @classmethod
     def __dot_devassistant_write_struct(cls, directory, struct):
-        """Helper for other methods that write to .devassistant file."""
-        dda_path = os.path.join(os.path.abspath(os.path.expanduser(directory)), '.devassistant')
-        f = open(dda_path, 'w')
-        yaml.dump(struct, stream=f, default_flow_style=False)
-        f.close()
+        """Helper for other methods that write to .devassistant file. The file is actually
+        written by next sync().
+        """
+        dda_path = cls._dda_path(directory)
+        if not os.path.isdir(os.path.dirname(dda_path)):
+            msg = 'Can\'t write .devassistant file, no such directory: {0}'.format(directory)
+            raise exceptions.CommandException(msg)
+        cls._documents[dda_path] = [struct, None]
+        cls._dirty.add(dda_path)
 
     @classmethod
     def __dot_devassistant_read_exact(cls, directory):
         """Helper for other methods that read .devassistant file."""
-        dda_path = os.path.join(os.path.abspath(os.path.expanduser(directory)), '.devassistant')
-        try:
-            with open(dda_path, 'r') as stream:
-                return yaml.load(stream)
-        except IOError as e:
-            msg = 'Couldn\'t find/open/read .devassistant file: {0}'.format(e)
-            raise exceptions.CommandException(msg)
+        return copy.deepcopy(cls._get_document(directory))
+
+    @classmethod
+    def sync(cls):
+        """Writes all .devassistant files modified since last sync to disk (each of them
+        atomically). This is done before running any command other than dda_* command and
+        at the end of the run.
+        """
+        for dda_path in sorted(cls._dirty):
+            tmp_path = dda_path + '.tmp'
+            try:
+                with open(tmp_path, 'w') as f:
+                    yaml.dump(cls._documents[dda_path][0], stream=f, Dumper=Dumper,
+                              default_flow_style=False)
+                os.rename(tmp_path, dda_path)
+                st = os.stat(dda_path)
+            except (IOError, OSError) as e:
+                msg = 'Couldn\'t write .devassistant file: {0}'.format(e)
+                raise exceptions.CommandException(msg)
+            cls._documents[dda_path][1] = (st.st_mtime, st.st_size)
+            cls._dirty.remove(dda_path)
 
     @classmethod
     def _dot_devassistant_create(cls, directory, kwargs):
@@ -350,7 +487,7 @@ class DotDevassistantCommandRunner(CommandRunner):
 
     @classmethod
     def _dot_devassistant_write(cls, comm):
-        dda_content = cls.__dot_devassistant_read_exact(comm[0])
+        dda_content = cls._get_document(comm[0])
         dda_content.update(comm[1])
         cls.__dot_devassistant_write_struct(comm[0], dda_content)
 
@@ -595,18 +732,56 @@ class SCLCommandRunner(CommandRunner):
     @classmethod
     def run(cls, c):
         c.kwargs['__scls__'].append(c.comm_type.split()[1:])
-        retval = lang.run_section(c.comm,
-                                  c.kwargs,
-                                  runner=c.kwargs['__assistant__'])
-        c.kwargs['__scls__'].pop()
+        # all commands in this block get run in one shell with the whole scl stack enabled
+        scls = functools.reduce(lambda x, y: x + y, c.kwargs['__scls__'], [])
+        ClHelper.open_scl_shell(scls)
+        try:
+            retval = lang.run_section(c.comm,
+                                      c.kwargs,
+                                      runner=c.kwargs['__assistant__'])
+        finally:
+            ClHelper.close_scl_shell(scls)
+            c.kwargs['__scls__'].pop()
 
         return retval
 
 @register_command_runner
 class Jinja2Runner(CommandRunner):
+    # jinja2 environments, one per templates dir, see _get_env
+    _envs = {}
+    # number of threads rendering templates of one directory in parallel
+    pool_size = 8
+    # number of template output chunks joined together before being written
+    stream_buffer_size = 64
+    # buffer size of rendered files
+    file_buffer_size = 64 * 1024
+
     @classmethod
     def matches(cls, c):
-        return c.comm_type == 'jinja_render'
+        return c.comm_type in ['jinja_render', 'jinja_render_dir']
+
+    @classmethod
+    def _get_env(cls, files_dir):
+        """Returns jinja2 environment for templates from given dir. The environments are
+        shared by all jinja_render commands, so every template is compiled at most once
+        per run; compiled templates are also stored in settings.JINJA_CACHE_DIR, so that
+        they only get compiled again once they change (unless cache is turned off).
+        """
+        if files_dir not in cls._envs:
+            bytecode_cache = None
+            if current_run.USE_CACHE:
+                try:
+                    if not os.path.isdir(settings.JINJA_CACHE_DIR):
+                        os.makedirs(settings.JINJA_CACHE_DIR)
+                    bytecode_cache = jinja2.FileSystemBytecodeCache(settings.JINJA_CACHE_DIR)
+                except OSError as e:
+                    logger.debug('Not caching compiled templates: {0}'.format(e))
+            env = jinja2.Environment(loader=jinja2.FileSystemLoader(files_dir),
+                                     bytecode_cache=bytecode_cache)
+            env.trim_blocks = True
+            env.lstrip_blocks = True
+            cls._envs[files_dir] = env
+        return cls._envs[files_dir]
 
     @classmethod
     def _make_output_file_name(cls, args, template):
@@ -659,6 +834,36 @@ class Jinja2Runner(CommandRunner):
 
         return (template, cls._make_output_file_name(args, template), data)
 
+    @classmethod
+    def _get_template(cls, env, template):
+        try:
+            logger.debug('Using template file: {0}'.format(template))
+            return env.get_template(template)
+        except jinja2.TemplateError as e:
+            raise exceptions.CommandException('Template file failure: {0}'.format(e))
+
+    @classmethod
+    def _render_to_file(cls, tpl, data, result_filename):
+        """Renders template into file chunk by chunk, so that whole output of the template
+        never has to be held in memory.
+        """
+        stream = tpl.stream(**data)
+        stream.enable_buffering(cls.stream_buffer_size)
+        with open(result_filename, 'w', cls.file_buffer_size) as out:
+            stream.dump(out)
+
+    @classmethod
+    def _check_destination(cls, args, result_filename):
+        """Check if destination file exists, remove it if it is to be overwritten."""
+        if os.path.exists(result_filename):
+            overwrite = args['overwrite'] if 'overwrite' in args else False
+            overwrite = True if overwrite == 'True' or overwrite == 'true' or overwrite == 'yes' else False
+            if overwrite:
+                logger.info('Overwriting the destination file {0}'.format(result_filename))
+                os.remove(result_filename)
+            else:
+                raise exceptions.CommandException('The destination file already exists: {0}'.format(result_filename))
+
     @classmethod
     def run(cls, c):
         # Transform list of dicts (where keys are unique) into a single dict
@@ -668,33 +873,81 @@ class Jinja2Runner(CommandRunner):
         # Get parameters
         template, result_filename, data = cls._try_obtain_mandatory_params(args)
 
-        # Create an environment!
+        # Get an environment!
         logger.debug('Using templats dir: {0}'.format(c.files_dir))
-        env = jinja2.Environment(loader=jinja2.FileSystemLoader(c.files_dir))
-        env.trim_blocks = True
-        env.lstrip_blocks = True
+        env = cls._get_env(c.files_dir)
+
+        if c.comm_type == 'jinja_render_dir':
+            return cls._render_dir(env, c.files_dir, template, data, args)
 
         # Get a template instance
-        tpl = None
-        try:
-            logger.debug('Using template file: {0}'.format(template))
-            tpl = env.get_template(template)
-        except jinja2.TemplateError as e:
-            raise exceptions.CommandException('Template file failure: {0}'.format(e.message))
+        tpl = cls._get_template(env, template)
 
         # Check if destination file exists, overwrite if needed
-        if os.path.exists(result_filename):
-            overwrite = args['overwrite'] if 'overwrite' in args else False
-            overwrite = True if overwrite == 'True' or overwrite == 'true' or overwrite == 'yes' else False
-            if overwrite:
-                logger.info('Overwriting the destination file {0}'.format(result_filename))
-                os.remove(result_filename)
-            else:
-                raise exceptions.CommandException('The destination file already exists: {0}'.format(result_filename))
+        cls._check_destination(args, result_filename)
 
         # Generate an output file finally...
-        with open(result_filename, 'w') as out:
-            result = tpl.render(**data)
-            out.write(result)
+        cls._render_to_file(tpl, data, result_filename)
+
+        return (True, 'success')
+
+    @classmethod
+    def _render_dir(cls, env, files_dir, template_dir, data, args):
+        """Renders all templates (files ending with ".tpl") from template_dir (a directory
+        in files_dir) and copies all other files from it, keeping the directory structure.
+        Files are processed in parallel by a pool of threads.
+        """
+        source_dir = os.path.join(files_dir, template_dir)
+        if not os.path.isdir(source_dir):
+            raise exceptions.CommandException('Template directory doesn\'t exist: {0}'.\
+                                              format(template_dir))
+        target_dir = os.path.join(args['destination'], args.get('output', ''))
+
+        # list of (source file, template name or None, destination file)
+        jobs = []
+        for dirpath, dirnames, filenames in os.walk(source_dir):
+            for f in filenames:
+                source = os.path.join(dirpath, f)
+                relpath = os.path.relpath(source, source_dir)
+                if f.endswith('.tpl'):
+                    name = '/'.join([template_dir] + relpath.split(os.sep))
+                    jobs.append((source, name, os.path.join(target_dir, relpath[:-len('.tpl')])))
+                else:
+                    jobs.append((source, None, os.path.join(target_dir, relpath)))
+
+        # check all destinations and create all directories before writing anything
+        for _, _, destination in jobs:
+            cls._check_destination(args, destination)
+        try:
+            for d in sorted(set([os.path.dirname(destination) for _, _, destination in jobs])):
+                if not os.path.isdir(d):
+                    os.makedirs(d)
+        except (IOError, OSError) as e:
+            raise exceptions.CommandException('Failed to render templates: {0}'.format(e))
+
+        def process(job):
+            source, name, destination = job
+            start = time.time()
+            if name:
+                cls._render_to_file(cls._get_template(env, name), data, destination)
+            else:
+                shutil.copyfile(source, destination)
+            shutil.copymode(source, destination)
+            logger.debug('{0} {1} to {2} in {3:.3f}s'.format('Rendered' if name else 'Copied',
+                                                            source, destination,
+                                                            time.time() - start))
+
+        start = time.time()
+        pool = ThreadPool(cls.pool_size)
+        try:
+            pool.map(process, jobs)
+        except (IOError, OSError) as e:
+            raise exceptions.CommandException('Failed to render templates: {0}'.format(e))
+        finally:
+            pool.close()
+            pool.join()
+        rendered = len([job for job in jobs if job[1]])
+        logger.info('Rendered {0} templates and copied {1} files to {2} in {3:.2f}s'.\
+                    format(rendered, len(jobs) - rendered, target_dir, time.time() - start))
 
         return (True, 'success')
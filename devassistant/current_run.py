@@ -1,2 +1,5 @@
 UI='cli'
 USE_CACHE = True
+# install dependencies of all "dependencies" commands of a run in as few transactions
+# as possible (see DependencyInstaller.start_aggregating)
+AGGREGATE_DEPENDENCIES = True
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import tarfile
+import tempfile
+
+import yaml
+try:
+    from yaml import CDumper as Dumper
+except ImportError:
+    from yaml import Dumper
+
+import devassistant
+
+from devassistant import current_run
+from devassistant.logger import logger
+from devassistant import settings
+from devassistant import yaml_loader
+
+class GenerationCache(object):
+    """Representation of generation cache - snapshots of project trees created by
+    assistants. If the same assistant is run with the same arguments again and none
+    of source files used by it (assistants, snippets, their files directories) has
+    changed, the project tree is extracted from the snapshot instead of executing run
+    sections of the assistant. Dependencies are installed normally.
+
+    The cache is only used if settings.GENERATION_CACHE_DIR is set (it's opt-in, since
+    side effects of run sections other than creating the project tree are not repeated)
+    and only for runs that create a new project directory given by "name" argument.
+    It has following structure:
+
+    GENERATION_CACHE_DIR/
+      # one record per assistant path and arguments, named by hash of them
+      <key>.yaml: {'archive': '<sha256>.tar.gz',
+                   # source files used by the run with their fingerprints
+                   'sourcefiles': {'/foo/assistants/crt/python.yaml': '<sha1>', ...},
+                   'version': devassistant.__version__}
+      # snapshots of project trees, named by hash of their content
+      objects/<sha256>.tar.gz
+    """
+    # source files used by current run (see add_sourcefile); None if the cache isn't
+    # used for current run
+    sourcefiles = None
+
+    def __init__(self, cache_dir, path, parsed_args):
+        self.cache_dir = cache_dir
+        self.target = os.path.abspath(os.path.expanduser(parsed_args['name']))
+        key = {'path': [a.name for a in path],
+               'args': dict([(k, v) for k, v in parsed_args.items() if not k.startswith('__')])}
+        digest = hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode('utf8'))
+        self.record_file = os.path.join(cache_dir, digest.hexdigest() + '.yaml')
+
+    @classmethod
+    def get(cls, path, parsed_args):
+        """Returns GenerationCache for run of given assistant path with given arguments
+        or None if the cache is not to be used for it.
+        """
+        cls.finish()
+        cache_dir = settings.GENERATION_CACHE_DIR
+        if not cache_dir or not current_run.USE_CACHE:
+            return None
+        if 'deps_only' in parsed_args or not parsed_args.get('name'):
+            return None
+        cache = cls(os.path.abspath(os.path.expanduser(cache_dir)), path, parsed_args)
+        if os.path.exists(cache.target):
+            return None
+        cls.sourcefiles = []
+        for a in path:
+            if hasattr(a, 'files_dir'):
+                cls.add_sourcefile(a.path, a.files_dir)
+        return cache
+
+    @classmethod
+    def add_sourcefile(cls, *paths):
+        """Remembers that given source files (or directories) are used by current run,
+        if the cache is used for it.
+        """
+        if cls.sourcefiles is None:
+            return
+        for p in paths:
+            if p and p not in cls.sourcefiles:
+                cls.sourcefiles.append(p)
+
+    @classmethod
+    def finish(cls):
+        """Stops remembering source files, must be called when the run ends."""
+        cls.sourcefiles = None
+
+    @classmethod
+    def fingerprint(cls, path):
+        """Returns sha1 of content of given file or of names, sizes and mtimes of all
+        files in given directory; None if it doesn't exist.
+        """
+        digest = hashlib.sha1()
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for f in sorted(filenames):
+                    st = os.stat(os.path.join(dirpath, f))
+                    line = '{0} {1} {2}\n'.format(os.path.relpath(os.path.join(dirpath, f), path),
+                                                  st.st_size, st.st_mtime)
+                    digest.update(line.encode('utf8'))
+        elif os.path.isfile(path):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        else:
+            return None
+        return digest.hexdigest()
+
+    def lookup(self):
+        """Returns path to valid snapshot of project tree for this run or None if there
+        is none.
+        """
+        if not os.path.exists(self.record_file):
+            return None
+        try:
+            record = yaml_loader.YamlLoader.load_yaml_by_path(self.record_file) or {}
+        except (IOError, OSError, yaml.YAMLError) as e:
+            logger.debug('Failed to load generation cache record: {0}'.format(e))
+            return None
+        archive = os.path.join(self.cache_dir, 'objects', record.get('archive', ''))
+        if record.get('version') != devassistant.__version__ or not os.path.isfile(archive):
+            return None
+        for sourcefile, fingerprint in record.get('sourcefiles', {}).items():
+            if self.fingerprint(sourcefile) != fingerprint:
+                logger.debug('{0} changed, not using generation cache'.format(sourcefile))
+                return None
+        return archive
+
+    def restore(self, snapshot):
+        """Extracts given snapshot of project tree (see lookup)."""
+        logger.info('Restoring {0} from generation cache ...'.format(self.target))
+        tar = tarfile.open(snapshot, 'r:gz')
+        try:
+            tar.extractall(os.path.dirname(self.target))
+        finally:
+            tar.close()
+
+    def store(self):
+        """Stores snapshot of project tree created by current run."""
+        if not os.path.isdir(self.target):
+            return
+        objects_dir = os.path.join(self.cache_dir, 'objects')
+        if not os.path.isdir(objects_dir):
+            os.makedirs(objects_dir)
+
+        fd, tmp_archive = tempfile.mkstemp(dir=objects_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                tar = tarfile.open(fileobj=f, mode='w:gz')
+                try:
+                    tar.add(self.target, arcname=os.path.basename(self.target))
+                finally:
+                    tar.close()
+            digest = hashlib.sha256()
+            with open(tmp_archive, 'rb') as f:
+                for chunk in iter(lambda: f.read(64 * 1024), b''):
+                    digest.update(chunk)
+            archive = digest.hexdigest() + '.tar.gz'
+            os.rename(tmp_archive, os.path.join(objects_dir, archive))
+        except BaseException:
+            if os.path.exists(tmp_archive):
+                os.remove(tmp_archive)
+            raise
+
+        record = {'archive': archive,
+                  'sourcefiles': dict([(s, self.fingerprint(s)) for s in self.sourcefiles]),
+                  'version': devassistant.__version__}
+        fd, tmp_record = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(fd, 'w') as f:
+            yaml.dump(record, stream=f, Dumper=Dumper, default_flow_style=False)
+        os.rename(tmp_record, self.record_file)
+        logger.debug('Stored {0} in generation cache'.format(self.target))
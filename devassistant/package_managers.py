@@ -21,11 +21,23 @@ represent these high-level tools like YUM or Zypper, not RPM itself.
 """
 from __future__ import print_function
 import collections
+import hashlib
+import json
 import math
 import os
+import re
+import shutil
+import site
 import sys
 import tempfile
 import threading
+import time
+
+import yaml
+try:
+    from yaml import CDumper as Dumper
+except ImportError:
+    from yaml import Dumper
 
 from devassistant import current_run
 from devassistant.command_helpers import ClHelper, DialogHelper
@@ -33,6 +45,7 @@ from devassistant.logger import logger
 from devassistant import exceptions
 from devassistant import utils
 from devassistant import settings
+from devassistant import yaml_loader
 
 # mapping of dependency types to managers that handle them
 # e.g. {'rpm': [YUMPackageManager, DNFPackageManager],
@@ -49,6 +62,8 @@ class PackageManager(object):
 
     # Indicates whether this is a system manager.
     is_system = True
+    # Paths whose mtimes change whenever this manager installs or removes a package.
+    db_paths = []
 
     @classmethod
     def get_perm_prompt(cls, package_list):
@@ -80,6 +95,56 @@ class PackageManager(object):
         """Is a package managed by this manager installed?"""
         raise NotImplementedError()
 
+    @classmethod
+    def are_pkgs_installed(cls, pkgs):
+        """Is each of given packages managed by this manager installed?
+
+        Managers that can query presence of more packages at once (which is usually much
+        faster than querying them one by one) should override this.
+
+        Returns:
+            dict {pkg: result of is_pkg_installed for pkg}
+        """
+        return dict([(pkg, cls.is_pkg_installed(pkg)) for pkg in pkgs])
+
+    @classmethod
+    def get_db_fingerprint(cls):
+        """Returns cheaply computed fingerprint of the package database of this manager,
+        that changes whenever a package is installed or removed. Results of installed
+        state checks are remembered between DevAssistant invocations until the fingerprint
+        changes (see InstalledPackagesIndex).
+
+        Returns:
+            list of [path, mtime] pairs or None if the database can't be fingerprinted
+        """
+        if not cls.db_paths:
+            return None
+        return cls.paths_fingerprint(cls.db_paths)
+
+    @classmethod
+    def paths_fingerprint(cls, paths):
+        fingerprint = []
+        for path in paths:
+            try:
+                fingerprint.append([path, os.path.getmtime(path)])
+            except OSError:
+                fingerprint.append([path, None])
+        return fingerprint
+
+    @classmethod
+    def canonical_name(cls, dep):
+        """Returns name that identifies package required by given dependency, so that
+        dependencies that require the same package can be recognized (see DependencyPlan).
+        """
+        return dep.strip()
+
+    @classmethod
+    def merge_deps(cls, dep1, dep2):
+        """Merges two dependencies with the same canonical name into one, that satisfies
+        both of them. By default, the first one is kept.
+        """
+        return dep1
+
     @classmethod
     def resolve(cls, *args, **kwargs):
         """
@@ -88,6 +153,26 @@ class PackageManager(object):
         """
         raise NotImplementedError()
 
+    @classmethod
+    def prefetch(cls, *args):
+        """Downloads given (resolved) packages ahead of their installation, so that
+        install() doesn't have to. This runs while packages of another manager are being
+        installed, so it must not need any locks held by installation. Failures must be
+        ignored - install() has to work even if nothing was prefetched.
+
+        Does nothing by default.
+        """
+        pass
+
+    @classmethod
+    def discard_prefetched(cls):
+        """Discards whatever prefetch has downloaded, if it won't be installed (e.g. because
+        installation of packages of another manager has failed).
+
+        Does nothing by default.
+        """
+        pass
+
     @classmethod
     def get_distro_dependencies(cls, smgr_sc):
         """
@@ -114,6 +199,13 @@ class YUMPackageManager(PackageManager):
     c_rpm = 'rpm'
     c_yum = 'yum'
 
+    # transactions resolved previously, see _load_resolved
+    _resolved = None
+
+    db_paths = ['/var/lib/rpm/Packages',
+                '/var/lib/rpm/rpmdb.sqlite',
+                '/usr/lib/sysimage/rpm/rpmdb.sqlite']
+
     @classmethod
     def rpm_q(cls, rpm_name):
         try:
@@ -150,6 +242,98 @@ class YUMPackageManager(PackageManager):
             logger.info('Not found, will install', extra={'event_type': 'dep_not_found'})
         return False
 
+    @classmethod
+    def rpm_q_all(cls, rpm_names):
+        """Queries presence of all given rpms at once. Uses rpm Python bindings if they
+        are available, else runs a single "rpm -q --whatprovides" for all of them.
+
+        Returns:
+            dict {rpm_name: found rpm or False}
+        """
+        rpm_names = [n.strip() for n in rpm_names]
+        if not rpm_names:
+            return {}
+        try:
+            import rpm
+        except ImportError:
+            return cls._rpm_q_all_cl(rpm_names)
+
+        ts = rpm.TransactionSet()
+        result = {}
+        for name in rpm_names:
+            result[name] = False
+            # the same as rpm -q --whatprovides does for paths and other provides
+            tag = 'basenames' if name.startswith('/') else 'providename'
+            for hdr in ts.dbMatch(tag, name):
+                result[name] = hdr.sprintf('%{NAME}-%{VERSION}-%{RELEASE}.%{ARCH}')
+                break
+        return result
+
+    @classmethod
+    def _rpm_q_all_cl(cls, rpm_names):
+        not_provided = 'no package provides '
+        cmd = [cls.c_rpm, '-q', '--whatprovides']
+        cmd.extend(map(lambda n: '"' + n + '"', rpm_names))
+        failed = False
+        try:
+            output = ClHelper.run_command(' '.join(cmd))
+        except exceptions.ClException as e:
+            output = e.output
+            failed = True
+
+        lines = [l.strip() for l in output.splitlines() if l.strip()]
+        if failed and not [l for l in lines if l.startswith(not_provided)]:
+            # rpm failed for other reason than missing packages, we can't trust the output
+            return dict([(n, False) for n in rpm_names])
+        if len(lines) != len(rpm_names):
+            # some name is provided by more packages, so the output lines can't be
+            # matched to names by their order; query these names one by one
+            return dict([(n, cls.rpm_q(n)) for n in rpm_names])
+
+        # rpm prints one line per name in order of arguments
+        return dict([(n, not l.startswith(not_provided) and l) for n, l in zip(rpm_names, lines)])
+
+    @classmethod
+    def installed_groups(cls, groups):
+        """Queries presence of all given groups by reading comps only once.
+
+        Args:
+            groups: names or ids of groups (possibly prefixed by "@")
+        Returns:
+            dict {group: group or False}
+        """
+        if not groups:
+            return {}
+        import yum
+        y = yum.YumBase()
+        y.preconf.debuglevel = 0
+        installed_names = set()
+        for grp in y.doGroupLists(uservisible=0)[0]:
+            installed_names.update([grp.groupid, grp.name, grp.ui_name])
+
+        return dict([(g, g.lstrip('@') in installed_names and g) for g in groups])
+
+    @classmethod
+    def are_pkgs_installed(cls, pkgs):
+        groups = [p for p in pkgs if p.startswith('@')]
+        rpms = [p for p in pkgs if not p.startswith('@')]
+        for pkg in pkgs:
+            logger.info('Checking for presence of {0}...'.format(pkg),
+                        extra={'event_type': 'dep_check'})
+
+        found = cls.installed_groups(groups)
+        found_rpms = cls.rpm_q_all(rpms)
+        for pkg in rpms:
+            found[pkg] = found_rpms[pkg.strip()]
+
+        for pkg in pkgs:
+            if found[pkg]:
+                logger.info('Found {0}'.format(found[pkg]), extra={'event_type': 'dep_found'})
+            else:
+                logger.info('{0} not found, will install'.format(pkg),
+                            extra={'event_type': 'dep_not_found'})
+        return found
+
     @classmethod
     def was_rpm_installed(cls, rpm_name):
         # TODO: handle failure
@@ -170,22 +354,73 @@ class YUMPackageManager(PackageManager):
 
     @classmethod
     def works(cls):
-        try:
-            import yum
-            return True
-        except ImportError:
-            return False
+        return utils.module_exists('yum')
 
     @classmethod
     def is_pkg_installed(cls, pkg):
         return cls.is_group_installed(pkg) if pkg.startswith('@') else cls.is_rpm_installed(pkg)
 
+    @classmethod
+    def _get_yum_base(cls):
+        """Returns YumBase that uses persistent per-user metadata cache."""
+        import yum
+        y = yum.YumBase()
+        if not os.path.exists(settings.YUM_CACHE_DIR):
+            os.makedirs(settings.YUM_CACHE_DIR)
+        y.setCacheDir(force=True, tmpdir=settings.YUM_CACHE_DIR, reuse=True)
+        return y
+
+    @classmethod
+    def _get_metadata_revision(cls, y):
+        """Returns revision of metadata of all enabled repos and of rpmdb. Resolved
+        transactions are only valid as long as this doesn't change.
+        """
+        repos = []
+        for repo in sorted(y.repos.listEnabled(), key=lambda r: r.id):
+            repos.append([repo.id, str(repo.repoXML.revision or repo.repoXML.timestamp)])
+        return [repos, cls.get_db_fingerprint()]
+
+    @classmethod
+    def _load_resolved(cls):
+        """Returns transactions resolved previously in the form of
+        {'revision': <metadata revision>, 'transactions': {'pkg1 pkg2': [ui_envra, ...]}}
+        """
+        if cls._resolved is None:
+            cls._resolved = {}
+            if current_run.USE_CACHE and os.path.exists(settings.YUM_RESOLVED_FILE):
+                try:
+                    cls._resolved = yaml_loader.YamlLoader.\
+                        load_yaml_by_path(settings.YUM_RESOLVED_FILE) or {}
+                except (IOError, OSError, yaml.YAMLError) as e:
+                    logger.debug('Failed to load resolved transactions: {0}'.format(e))
+        return cls._resolved
+
+    @classmethod
+    def _save_resolved(cls):
+        if not current_run.USE_CACHE:
+            return
+        try:
+            with open(settings.YUM_RESOLVED_FILE, 'w') as f:
+                yaml.dump(cls._resolved, f, Dumper=Dumper)
+        except (IOError, OSError) as e:
+            logger.debug('Failed to save resolved transactions: {0}'.format(e))
+
     @classmethod
     def resolve(cls, *args):
         logger.info('Resolving RPM dependencies ...')
         import yum
-        y = yum.YumBase()
-        y.setCacheDir(tempfile.mkdtemp())
+        y = cls._get_yum_base()
+
+        resolved = cls._load_resolved()
+        revision = cls._get_metadata_revision(y)
+        if resolved.get('revision') != revision:
+            resolved.clear()
+            resolved.update({'revision': revision, 'transactions': {}})
+        key = ' '.join(sorted(set(args)))
+        if key in resolved['transactions']:
+            logger.debug('Using previously resolved transaction for: {0}'.format(key))
+            return list(resolved['transactions'][key])
+
         for pkg in args:
             if pkg.startswith('@'):
                 y.selectGroup(pkg[1:])
@@ -202,12 +437,152 @@ class YUMPackageManager(PackageManager):
             to_install.append(pkg.po.ui_envra)
             logger.debug(pkg.po.ui_envra)
 
+        resolved['transactions'][key] = to_install
+        cls._save_resolved()
         return to_install
 
     def __str__(self):
         return "rpm package manager"
 
 
+@register_manager
+class DNFPackageManager(PackageManager):
+    """Package manager for managing rpm packages from repositories by DNF.
+    Unlike YUMPackageManager, it loads the package sack only once per DevAssistant run
+    and uses it for checking installed state of all packages and resolving them."""
+    permission_prompt = "Installing {num} RPM package{plural} by DNF. Is this ok?"
+    shortcut = 'rpm'
+
+    c_dnf = 'dnf'
+
+    db_paths = YUMPackageManager.db_paths
+
+    # dnf.Base with filled sack, shared by all operations during this run
+    _base = None
+    # True if the sack also contains available packages (not just installed ones)
+    _base_available = False
+
+    @classmethod
+    def _get_base(cls, available=False):
+        """Returns dnf.Base with filled sack. Available repos are only loaded (together
+        with comps) if requested, since that's needed only for resolving and groups.
+        """
+        if cls._base is None or (available and not cls._base_available):
+            import dnf
+            base = cls._base or dnf.Base()
+            if available:
+                base.read_all_repos()
+                base.fill_sack(load_system_repo=True, load_available_repos=True)
+                base.read_comps()
+            else:
+                base.fill_sack(load_system_repo=True, load_available_repos=False)
+            cls._base = base
+            cls._base_available = available
+        return cls._base
+
+    @classmethod
+    def _reset_base(cls):
+        cls._base = None
+        cls._base_available = False
+
+    @classmethod
+    def _find_installed(cls, installed, pkg, base):
+        """Returns name of installed package (or group) that satisfies pkg or False."""
+        if pkg.startswith('@'):
+            grp = base.comps.group_by_pattern(pkg[1:])
+            if grp is None:
+                return False
+            for grp_pkg in grp.mandatory_packages:
+                if not installed.filter(name=grp_pkg.name).run():
+                    return False
+            return pkg
+        if pkg.startswith('/'):
+            found = installed.filter(file=pkg).run()
+        else:
+            found = installed.filter(provides=pkg).run()
+        return str(found[0]) if found else False
+
+    @classmethod
+    def are_pkgs_installed(cls, pkgs):
+        for pkg in pkgs:
+            logger.info('Checking for presence of {0}...'.format(pkg),
+                        extra={'event_type': 'dep_check'})
+        need_comps = any([pkg.startswith('@') for pkg in pkgs])
+        base = cls._get_base(available=need_comps)
+        installed = base.sack.query().installed()
+
+        result = {}
+        for pkg in pkgs:
+            result[pkg] = cls._find_installed(installed, pkg.strip(), base)
+            if result[pkg]:
+                logger.info('Found {0}'.format(result[pkg]), extra={'event_type': 'dep_found'})
+            else:
+                logger.info('{0} not found, will install'.format(pkg),
+                            extra={'event_type': 'dep_not_found'})
+        return result
+
+    @classmethod
+    def is_pkg_installed(cls, pkg):
+        return cls.are_pkgs_installed([pkg])[pkg]
+
+    @classmethod
+    def resolve(cls, *args):
+        logger.info('Resolving RPM dependencies ...')
+        import dnf
+        base = cls._get_base(available=True)
+        try:
+            for pkg in args:
+                try:
+                    if pkg.startswith('@'):
+                        grp = base.comps.group_by_pattern(pkg[1:])
+                        if grp is None:
+                            raise dnf.exceptions.Error(pkg)
+                        base.group_install(grp.id, dnf.const.GROUP_PACKAGE_TYPES)
+                    else:
+                        base.install(pkg)
+                except dnf.exceptions.Error:
+                    msg = 'Package not found: {pkg}'.format(pkg=pkg)
+                    raise exceptions.DependencyException(msg)
+            try:
+                base.resolve()
+            except dnf.exceptions.Error as e:
+                msg = 'Failed to resolve dependencies: {0}'.format(e)
+                raise exceptions.DependencyException(msg)
+
+            logger.debug('Installing/Updating:')
+            to_install = []
+            for pkg in base.transaction.install_set:
+                to_install.append(str(pkg))
+                logger.debug(str(pkg))
+        finally:
+            # forget the goal, but keep the loaded sack
+            base.reset(goal=True)
+
+        return to_install
+
+    @classmethod
+    def install(cls, *args):
+        # the whole resolved transaction is installed by a single dnf invocation
+        cmd = ['pkexec', cls.c_dnf, '-y', 'install']
+        quoted_pkgs = map(lambda pkg: '"{pkg}"'.format(pkg=pkg), args)
+        cmd.extend(quoted_pkgs)
+        try:
+            ClHelper.run_command(' '.join(cmd), ignore_sigint=True)
+            return args
+        except exceptions.ClException:
+            return False
+        finally:
+            # installed packages have changed, the sack needs to be loaded again
+            cls._reset_base()
+
+    @classmethod
+    def works(cls):
+        return utils.module_exists('dnf')
+
+    def __str__(self):
+        return "dnf package manager"
+
+
 @register_manager
 class PacmanPackageManager(PackageManager):
     """Package manager for managing Arch Linux packages by pacman."""
@@ -216,6 +591,13 @@ class PacmanPackageManager(PackageManager):
 
     c_pacman = 'pacman'
 
+    local_db_dir = '/var/lib/pacman/local'
+    db_paths = [local_db_dir]
+
+    # snapshot of local database - ({name: version} of installed packages, set of groups
+    # with installed packages), see get_local_db
+    _local_db = None
+
     @classmethod
     def install(cls, *args):
         cmd = ['pkexec', cls.c_pacman, '-S', '--noconfirm']
@@ -226,17 +608,78 @@ class PacmanPackageManager(PackageManager):
             return args
         except exceptions.ClException:
             return False
+        finally:
+            cls._local_db = None
+
+    @classmethod
+    def get_local_db(cls):
+        """Returns snapshot of local database, read just once per run (until something gets
+        installed) - directly from cls.local_db_dir if it exists, from pacman otherwise.
+
+        Returns:
+            ({name: version} of installed packages, set of groups with installed packages)
+        """
+        if cls._local_db is None:
+            if os.path.isdir(cls.local_db_dir):
+                cls._local_db = cls._read_local_db()
+            else:
+                cls._local_db = cls._query_local_db()
+        return cls._local_db
+
+    @classmethod
+    def _read_local_db(cls):
+        """Reads names, versions and groups of installed packages from "desc" files of
+        local database, which look like "%NAME%\nfoo\n\n%VERSION%\n1.0-1\n\n..."
+        """
+        packages = {}
+        groups = set()
+        for entry in os.listdir(cls.local_db_dir):
+            try:
+                with open(os.path.join(cls.local_db_dir, entry, 'desc')) as f:
+                    lines = f.read().splitlines()
+            except IOError:
+                continue
+            fields = {}
+            key = None
+            for line in lines:
+                if line.startswith('%') and line.endswith('%'):
+                    key = line
+                    fields[key] = []
+                elif line and key:
+                    fields[key].append(line)
+            if fields.get('%NAME%'):
+                packages[fields['%NAME%'][0]] = (fields.get('%VERSION%') or [''])[0]
+                groups.update(fields.get('%GROUPS%', []))
+        return packages, groups
+
+    @classmethod
+    def _query_local_db(cls):
+        """Queries names, versions and groups of installed packages by one "pacman -Q"
+        and one "pacman -Qg" call.
+        """
+        def query(option):
+            # lines look like "name version" (-Q) or "group name" (-Qg)
+            try:
+                output = ClHelper.run_command('{pacman} {option}'.format(pacman=cls.c_pacman,
+                                                                         option=option))
+            except exceptions.ClException:
+                return []
+            return [line.split() for line in output.splitlines() if len(line.split()) == 2]
+
+        packages = dict(query('-Q'))
+        groups = set([group for group, _ in query('-Qg')])
+        return packages, groups
 
     @classmethod
     def is_pacmanpkg_installed(cls, pkg_name):
         logger.info('Checking for presence of {0}...'.format(pkg_name), extra={'event_type': 'dep_check'})
 
-        try:
-            found_pkg = ClHelper.run_command('{pacman} -Q "{pkg}"'.\
-                                             format(pacman=cls.c_pacman, pkg=pkg_name))
+        packages, _ = cls.get_local_db()
+        if pkg_name in packages:
+            found_pkg = '{0} {1}'.format(pkg_name, packages[pkg_name])
             logger.info('Found {0}'.format(found_pkg), extra={'event_type': 'dep_found'})
             return found_pkg
-        except exceptions.ClException:
+        else:
             logger.info('Not found, will install', extra={'event_type': 'dep_not_found'})
             return False
 
@@ -244,21 +687,12 @@ class PacmanPackageManager(PackageManager):
     def is_group_installed(cls, group):
         logger.info('Checking for presence of group {0}...'.format(group))
 
-        try:
-            output = ClHelper.run_command('{pacman} -Qg "{group}"'.\
-                                          format(pacman=cls.c_pacman,
-                                                 group=group))
-            return group
-        except exceptions.ClException:
-            return False
+        _, groups = cls.get_local_db()
+        return group if group in groups else False
 
     @classmethod
     def works(cls):
-        try:
-            ClHelper.run_command('which pacman')
-            return True
-        except exceptions.ClException:
-            return False
+        return utils.which(cls.c_pacman) is not None
 
     @classmethod
     def is_pkg_installed(cls, pkg):
@@ -279,39 +713,275 @@ class PIPPackageManager(PackageManager):
 
     c_pip = 'pip'
 
+    # {normalized name: version} of distributions installed for interpreter used by pip
+    _installed = None
+    # sys.path of interpreter used by pip
+    _site_paths = None
+    # directory with distributions downloaded by prefetch, used by next install
+    _prefetch_dir = None
+    # splits dependency like "Foo[bar] >= 1.0" to name, extras and version specifier;
+    # doesn't match anything else (urls, dependencies with environment markers, ...)
+    _dep_regex = re.compile(r'^\s*([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[([^\]]*)\])?\s*'
+                            r'((?:[=<>!~][^;@]*)?)\s*$')
+
     @classmethod
-    def install(cls, *args):
-        cmd = [cls.c_pip, 'install', '--user']
+    def normalize_name(cls, name):
+        """Normalizes distribution name as described in PEP 503."""
+        return re.sub(r'[-_.]+', '-', name).lower()
+
+    @classmethod
+    def canonical_name(cls, dep):
+        match = cls._dep_regex.match(dep)
+        if not match:
+            return dep.strip()
+        return cls.normalize_name(match.group(1))
+
+    @classmethod
+    def merge_deps(cls, dep1, dep2):
+        """Merges e.g. "Foo[bar]>=1.0" and "foo[baz]<2" to "Foo[bar,baz]>=1.0,<2"."""
+        match1, match2 = cls._dep_regex.match(dep1), cls._dep_regex.match(dep2)
+        if not match1 or not match2:
+            return dep1
+        name, extras1, spec1 = match1.groups()
+        _, extras2, spec2 = match2.groups()
+        extras = []
+        specs = []
+        for e in (extras1 or '').split(',') + (extras2 or '').split(','):
+            if e.strip() and e.strip() not in extras:
+                extras.append(e.strip())
+        for s in spec1.split(',') + spec2.split(','):
+            if s.strip() and s.strip() not in specs:
+                specs.append(s.strip())
+        merged = name
+        if extras:
+            merged += '[{0}]'.format(','.join(extras))
+        return merged + ','.join(specs)
+
+    @classmethod
+    def get_pip_interpreter(cls):
+        """Returns path to Python interpreter that runs cls.c_pip (taken from its shebang)
+        or None if it can't be found out.
+        """
+        pip = utils.which(cls.c_pip)
+        if not pip:
+            return None
+        try:
+            with open(pip, 'rb') as f:
+                shebang = f.readline().decode('utf8', 'replace').strip()
+        except IOError:
+            return None
+        if not shebang.startswith('#!') or not shebang[2:].split():
+            return None
+        interpreter = shebang[2:].split()
+        if os.path.basename(interpreter[0]) == 'env' and len(interpreter) > 1:
+            return utils.which(interpreter[1])
+        return interpreter[0]
+
+    @classmethod
+    def get_site_paths(cls):
+        """Returns sys.path of the interpreter that "pip install --user" installs for,
+        including its user site - even if it doesn't exist yet, so that packages are found
+        there once the first "pip install --user" creates it.
+        """
+        if cls._site_paths is None:
+            interpreter = cls.get_pip_interpreter()
+            # the last line is user site ('' if the interpreter doesn't support it)
+            paths = sys.path + [getattr(site, 'getusersitepackages', lambda: '')()]
+            if interpreter and os.path.realpath(interpreter) != os.path.realpath(sys.executable):
+                cmd = '"{0}" -c "import site, sys; print(\'\\n\'.join(sys.path + '\
+                      '[getattr(site, \'getusersitepackages\', lambda: \'\')()]))"'.\
+                      format(interpreter)
+                try:
+                    paths = ClHelper.run_command(cmd).splitlines()
+                except exceptions.ClException:
+                    pass
+            user_site = paths[-1] if paths else ''
+            cls._site_paths = [p for p in paths if p and os.path.isdir(p)]
+            if user_site and user_site not in cls._site_paths:
+                cls._site_paths.append(user_site)
+        return cls._site_paths
+
+    @classmethod
+    def get_db_fingerprint(cls):
+        paths = [p for p in cls.get_site_paths()
+                 if os.path.basename(p) in ['site-packages', 'dist-packages']]
+        return cls.paths_fingerprint(paths)
+
+    @classmethod
+    def _load_installed(cls):
+        """Returns {normalized name: version} of all distributions installed in site paths.
+        Uses importlib.metadata or pkg_resources if available, "pip list" otherwise.
+        """
+        installed = {}
+        paths = cls.get_site_paths()
+        try:
+            from importlib import metadata
+            for dist in metadata.distributions(path=paths):
+                name = dist.metadata['Name']
+                if name:
+                    installed.setdefault(cls.normalize_name(name), dist.version)
+            return installed
+        except ImportError:
+            pass
+        try:
+            import pkg_resources
+            for dist in pkg_resources.WorkingSet(paths):
+                installed.setdefault(cls.normalize_name(dist.project_name), dist.version)
+            return installed
+        except ImportError:
+            pass
+
+        query = ClHelper.run_command(' '.join([cls.c_pip, 'list']))
+        for line in query.splitlines():
+            # both "name (version)" and "name   version" formats
+            parts = line.replace('(', ' ').replace(')', ' ').replace(',', ' ').split()
+            if len(parts) >= 2:
+                installed.setdefault(cls.normalize_name(parts[0]), parts[1])
+        return installed
+
+    @classmethod
+    def _version_matches(cls, version, specifier):
+        """Returns True if version matches specifier (e.g. ">=1.0,<2"), False otherwise."""
+        if not specifier:
+            return True
+        try:
+            from packaging.specifiers import SpecifierSet
+            return SpecifierSet(specifier).contains(version, prereleases=True)
+        except ImportError:
+            pass
+        try:
+            import pkg_resources
+            return version in pkg_resources.Requirement.parse('dep' + specifier)
+        except ImportError:
+            logger.debug('Can\'t compare version {0} with {1}, assuming it matches.'.\
+                         format(version, specifier))
+            return True
+
+    @classmethod
+    def find_installed(cls, dep):
+        """Returns "name version" of installed distribution that satisfies given dependency
+        (a requirement like "foo", "Foo_Bar[baz]>=1.0" ...) or False if there is none.
+        """
+        match = cls._dep_regex.match(dep)
+        if not match:
+            # not a requirement, but e.g. url; let pip take care of it
+            return False
+        name, _, specifier = match.groups()
+        if cls._installed is None:
+            cls._installed = cls._load_installed()
+        version = cls._installed.get(cls.normalize_name(name))
+        if version is None:
+            return False
+        try:
+            if not cls._version_matches(version, specifier):
+                return False
+        except ValueError as e:
+            logger.debug('Invalid dependency specification {0}: {1}'.format(dep, e))
+            return False
+        return '{0} {1}'.format(name, version)
+
+    @classmethod
+    def get_mirror(cls):
+        """Returns local wheelhouse to prefer when installing (created if it doesn't exist)
+        or None if it's not configured (see settings.PIP_MIRROR_DIR) or can't be used.
+        """
+        mirror = settings.PIP_MIRROR_DIR
+        if mirror:
+            mirror = os.path.abspath(os.path.expanduser(mirror))
+            try:
+                if not os.path.isdir(mirror):
+                    os.makedirs(mirror)
+            except (IOError, OSError) as e:
+                logger.warning('Can\'t use pip mirror {0}, installing without it: {1}'.\
+                               format(mirror, e))
+                return None
+        return mirror
+
+    @classmethod
+    def fill_mirror(cls, mirror, *args):
+        """Builds wheels of given packages and all their dependencies into the mirror,
+        reusing those that are already there.
+
+        Returns:
+            True on success, False otherwise
+        """
+        cmd = [cls.c_pip, 'wheel', '--wheel-dir', '"{0}"'.format(mirror),
+               '--find-links', '"{0}"'.format(mirror)]
+        cmd.extend(map(lambda pkg: '"{pkg}"'.format(pkg=pkg), args))
+        try:
+            ClHelper.run_command(' '.join(cmd))
+            return True
+        except exceptions.ClException as e:
+            logger.debug('Failed to fill pip mirror {0}: {1}'.format(mirror, e))
+            return False
+
+    @classmethod
+    def prefetch(cls, *args):
+        mirror = cls.get_mirror()
+        if mirror:
+            cls.fill_mirror(mirror, *args)
+            return
+        prefetch_dir = tempfile.mkdtemp(prefix='da-pip-')
+        cmd = [cls.c_pip, 'download', '-d', '"{0}"'.format(prefetch_dir)]
+        cmd.extend(map(lambda pkg: '"{pkg}"'.format(pkg=pkg), args))
+        try:
+            ClHelper.run_command(' '.join(cmd))
+            cls._prefetch_dir = prefetch_dir
+        except exceptions.ClException as e:
+            logger.debug('Failed to prefetch PyPI packages: {0}'.format(e))
+            shutil.rmtree(prefetch_dir, ignore_errors=True)
+
+    @classmethod
+    def discard_prefetched(cls):
+        if cls._prefetch_dir:
+            shutil.rmtree(cls._prefetch_dir, ignore_errors=True)
+            cls._prefetch_dir = None
+
+    @classmethod
+    def _run_install(cls, options, args):
+        cmd = [cls.c_pip, 'install', '--user'] + options
         quoted_pkgs = map(lambda pkg: '"{pkg}"'.format(pkg=pkg), args)
         cmd.extend(quoted_pkgs)
         try:
             ClHelper.run_command(' '.join(cmd), ignore_sigint=True)
-            return args
+            return True
         except exceptions.ClException:
             return False
 
     @classmethod
-    def works(cls):
+    def install(cls, *args):
         try:
-            ClHelper.run_command('pip')
-            return True
-        except exceptions.ClException:
-            return False
+            mirror = cls.get_mirror()
+            if mirror:
+                # install just from the mirror, fill it first if something is missing there
+                offline = ['--no-index', '--find-links', '"{0}"'.format(mirror)]
+                if cls._run_install(offline, args) or \
+                        (cls.fill_mirror(mirror, *args) and cls._run_install(offline, args)):
+                    return args
+            options = []
+            if cls._prefetch_dir:
+                options = ['--find-links', '"{0}"'.format(cls._prefetch_dir)]
+            return args if cls._run_install(options, args) else False
+        finally:
+            cls._installed = None
+            cls._site_paths = None
+            cls.discard_prefetched()
+
+    @classmethod
+    def works(cls):
+        return utils.which(cls.c_pip) is not None
 
     @classmethod
     def is_pkg_installed(cls, dep):
         logger.info('Checking for presence of {0}...'.format(dep),
                     extra={'event_type': 'dep_check'})
-        if not getattr(cls, '_installed', None):
-            query = ClHelper.run_command(' '.join([cls.c_pip, 'list']))
-            cls._installed = query.split('\n')
-        search = filter(lambda e: e.startswith(dep + ' '), cls._installed)
-        if search:
-            logger.info('Found {0}'.format(search[0]), extra={'event_type': 'dep_found'})
+        found = cls.find_installed(dep)
+        if found:
+            logger.info('Found {0}'.format(found), extra={'event_type': 'dep_found'})
         else:
             logger.info('Not found, will install', extra={'event_type': 'dep_not_found'})
 
-        return len(search) > 0
+        return found
 
     @classmethod
     def resolve(cls, *dep):
@@ -337,9 +1007,150 @@ class NPMPackageManager(PackageManager):
 
     c_npm = 'npm'
 
+    # {install target (see get_install_target): {name: version}} of top-level packages
+    _installed = {}
+    _global_prefix = None
+    # True if packages for next install were put into npm cache by prefetch
+    _prefetched = False
+
+    @classmethod
+    def is_global(cls):
+        """Returns True if npm is configured to install packages globally."""
+        return os.environ.get('npm_config_global', '').lower() in ['true', '1']
+
+    @classmethod
+    def get_project_dir(cls):
+        """Returns directory of project that "npm install" installs to - the closest
+        directory containing package.json or node_modules (current directory if none).
+        """
+        d = os.getcwd()
+        while True:
+            if os.path.exists(os.path.join(d, 'package.json')) or \
+                    os.path.isdir(os.path.join(d, 'node_modules')):
+                return d
+            parent = os.path.dirname(d)
+            if parent == d:
+                return os.getcwd()
+            d = parent
+
+    @classmethod
+    def get_install_target(cls):
+        """Returns directory that "npm install" installs to - either global prefix or
+        project directory.
+        """
+        if cls.is_global():
+            if cls._global_prefix is None:
+                cls._global_prefix = ClHelper.run_command(' '.join([cls.c_npm, 'prefix', '-g']))
+            return cls._global_prefix
+        return cls.get_project_dir()
+
+    @classmethod
+    def get_node_modules(cls):
+        target = cls.get_install_target()
+        if cls.is_global():
+            return os.path.join(target, 'lib', 'node_modules')
+        return os.path.join(target, 'node_modules')
+
+    @classmethod
+    def get_db_fingerprint(cls):
+        return cls.paths_fingerprint([cls.get_node_modules()])
+
+    @classmethod
+    def split_dep(cls, dep):
+        """Splits dependency like "foo@1.0" or "@scope/foo@^1.0" to name and version."""
+        at = dep.find('@', 1)
+        if at == -1:
+            return dep, ''
+        return dep[:at], dep[at + 1:]
+
+    @classmethod
+    def canonical_name(cls, dep):
+        return cls.split_dep(dep.strip())[0]
+
+    @classmethod
+    def merge_deps(cls, dep1, dep2):
+        """Merges e.g. "foo@>=1.0" and "foo@<2" to "foo@>=1.0 <2". Dependencies with tags,
+        urls or alternative ranges ("||") can't be merged, the first one is kept then.
+        """
+        name, range1 = cls.split_dep(dep1.strip())
+        _, range2 = cls.split_dep(dep2.strip())
+        if not range2 or range1 == range2:
+            return dep1
+        if not range1:
+            return '{0}@{1}'.format(name, range2)
+        for r in [range1, range2]:
+            if re.match(r'[A-Za-z]', r) or '||' in r:
+                return dep1
+        return '{0}@{1} {2}'.format(name, range1, range2)
+
+    @classmethod
+    def _load_installed(cls):
+        """Returns {name: version} of packages installed in top level of install target."""
+        cmd = [cls.c_npm, 'ls', '--json', '--depth=0']
+        if cls.is_global():
+            cmd.append('-g')
+        try:
+            output = ClHelper.run_command(' '.join(cmd))
+        except exceptions.ClException as e:
+            # npm ls fails if there are missing or extraneous packages, but still lists them
+            output = e.output
+        # output may contain npm warnings/errors, since stderr is merged into it
+        try:
+            listed = json.loads(output[output.find('{'):output.rfind('}') + 1])
+        except ValueError as e:
+            logger.debug('Failed to parse output of npm ls: {0}'.format(e))
+            return {}
+
+        installed = {}
+        for name, info in listed.get('dependencies', {}).items():
+            if not info.get('missing', False):
+                installed[name] = info.get('version', '')
+        return installed
+
+    @classmethod
+    def find_installed(cls, dep):
+        """Returns "name@version" of installed package or False if it's not installed.
+        Note: version ranges are not checked, any installed version is considered fine.
+        """
+        target = cls.get_install_target()
+        if target not in cls._installed:
+            cls._installed[target] = cls._load_installed()
+        name, _ = cls.split_dep(dep)
+        if name not in cls._installed[target]:
+            return False
+        return '{0}@{1}'.format(name, cls._installed[target][name])
+
+    @classmethod
+    def get_mirror_options(cls):
+        """Returns options that make npm use local tarball cache (see
+        settings.NPM_MIRROR_DIR) instead of the default one, if it's configured. Every
+        downloaded package gets stored in the cache by npm itself.
+        """
+        if not settings.NPM_MIRROR_DIR:
+            return []
+        mirror = os.path.abspath(os.path.expanduser(settings.NPM_MIRROR_DIR))
+        return ['--cache', '"{0}"'.format(mirror)]
+
+    @classmethod
+    def prefetch(cls, *args):
+        cmd = [cls.c_npm, 'cache', 'add'] + cls.get_mirror_options()
+        cmd.extend(map(lambda pkg: '"{pkg}"'.format(pkg=pkg), args))
+        try:
+            ClHelper.run_command(' '.join(cmd))
+            cls._prefetched = True
+        except exceptions.ClException as e:
+            logger.debug('Failed to prefetch NPM packages: {0}'.format(e))
+
+    @classmethod
+    def discard_prefetched(cls):
+        cls._prefetched = False
+
     @classmethod
     def install(cls, *args):
-        cmd = [cls.c_npm, 'install']
+        cmd = [cls.c_npm, 'install'] + cls.get_mirror_options()
+        if cls._prefetched or settings.NPM_MIRROR_DIR:
+            # use cached metadata and tarballs whenever possible, even if they're stale
+            cmd.append('--prefer-offline')
         quoted_pkgs = map(lambda pkg: '"{pkg}"'.format(pkg=pkg), args)
         cmd.extend(quoted_pkgs)
         try:
@@ -347,29 +1158,25 @@ class NPMPackageManager(PackageManager):
             return args
         except exceptions.ClException:
             return False
+        finally:
+            cls._installed.pop(cls.get_install_target(), None)
+            cls._prefetched = False
 
     @classmethod
     def works(cls):
-        try:
-            ClHelper.run_command('npm')
-            return True
-        except exceptions.ClException as e:
-            return False
+        return utils.which(cls.c_npm) is not None
 
     @classmethod
     def is_pkg_installed(cls, dep):
         logger.info('Checking for presence of {0}...'.format(dep),
                     extra={'event_type': 'dep_check'})
-        if not getattr(cls, '_installed', None):
-            query = ClHelper.run_command(' '.join([cls.c_npm, 'list']))
-            cls._installed = query.split('\n')
-        search = filter(lambda e: e.startswith(dep + ' '), cls._installed)
-        if search:
-            logger.info('Found {0}'.format(search[0]), extra={'event_type': 'dep_found'})
+        found = cls.find_installed(dep)
+        if found:
+            logger.info('Found {0}'.format(found), extra={'event_type': 'dep_found'})
         else:
             logger.info('Not found, will install', extra={'event_type': 'dep_not_found'})
 
-        return len(search) > 0
+        return found
 
     @classmethod
     def resolve(cls, *dep):
@@ -455,6 +1262,12 @@ class EmergePackageManager(PackageManager, GentooPackageManager):
 
     shortcut = 'ebuild'
 
+    # portage increments the counter on every merge
+    db_paths = ['/var/db/pkg', '/var/cache/edb/counter']
+
+    # portage trees of current root, see get_trees
+    _trees = None
+
     @classmethod
     def install(cls, *args, **kwargs):
         raise NotImplementedError()
@@ -465,18 +1278,35 @@ class EmergePackageManager(PackageManager, GentooPackageManager):
         return cls.is_current_manager_equals_to(GentooPackageManager.PORTAGE)
 
     @classmethod
-    def is_pkg_installed(cls, pkg):
-        """Is a package managed by this manager installed?"""
+    def get_trees(cls):
+        """Returns portage trees (databases) of current root, obtained just once per run.
+        Nothing ever gets installed by this manager, so they never need to be refreshed.
+        """
+        if cls._trees is None:
+            import portage
+            cls._trees = portage.db[portage.root]
+        return cls._trees
+
+    @classmethod
+    def are_pkgs_installed(cls, pkgs):
         import portage
         # Get access to installed packages DB
-        vartree = portage.db[portage.root]['vartree']
-        try:
-            r = vartree.dbapi.match(pkg)
-            logger.debug('Checking is installed: {0} -> {1}'.format(pkg, repr(r)))
-        except portage.exception.InvalidAtom:
-            raise exceptions.DependencyException('Invalid dependency specification: {0}'.format(pkg))
-        # TODO Compare package version!
-        return bool(r)
+        vardb = cls.get_trees()['vartree'].dbapi
+        result = {}
+        for pkg in pkgs:
+            try:
+                r = vardb.match(pkg)
+                logger.debug('Checking is installed: {0} -> {1}'.format(pkg, repr(r)))
+            except portage.exception.InvalidAtom:
+                raise exceptions.DependencyException('Invalid dependency specification: {0}'.format(pkg))
+            # TODO Compare package version!
+            result[pkg] = bool(r)
+        return result
+
+    @classmethod
+    def is_pkg_installed(cls, pkg):
+        """Is a package managed by this manager installed?"""
+        return cls.are_pkgs_installed([pkg])[pkg]
 
     @classmethod
     def resolve(cls, *deps):
@@ -493,7 +1323,7 @@ class EmergePackageManager(PackageManager, GentooPackageManager):
 
         logger.info('[portage] Resolving dependencies ...')
 
-        porttree = portage.db[portage.root]['porttree']
+        porttree = cls.get_trees()['porttree']
         to_install = set()
         for dep in deps:
             res = porttree.dep_bestmatch(dep)
@@ -520,6 +1350,9 @@ class PaludisPackageManager(PackageManager, GentooPackageManager):
 
     shortcut = 'ebuild'
 
+    # paludis environment, see get_env
+    _env = None
+
     @classmethod
     def install(cls, *args, **kwargs):
         raise NotImplementedError()
@@ -530,22 +1363,40 @@ class PaludisPackageManager(PackageManager, GentooPackageManager):
         return cls.is_current_manager_equals_to(GentooPackageManager.PALUDIS)
 
     @classmethod
-    def is_pkg_installed(cls, dep):
-        """Is a package managed by this manager installed?"""
+    def get_env(cls):
+        """Returns paludis environment, created just once per run (creating it is very
+        expensive). Nothing ever gets installed by this manager, so it never needs to be
+        refreshed.
+        """
+        if cls._env is None:
+            import paludis
+            cls._env = paludis.EnvironmentFactory.instance.create('')
+        return cls._env
+
+    @classmethod
+    def are_pkgs_installed(cls, deps):
         import paludis
-        env = paludis.EnvironmentFactory.instance.create('')
+        env = cls.get_env()
         installed = env.fetch_repository('installed')
-        try:
-            pkg = paludis.parse_user_package_dep_spec(dep, env, paludis.UserPackageDepSpecOptions())
-            # TODO Compare package version!
-            r = []
-            for i in installed.package_ids(str(pkg.package), []):
-                r.append(str(i))
-            logger.debug('Checking is installed: {0} -> {1}'.format(pkg, repr(r)))
-            return r
-        except paludis.BaseException as e:
-            msg = 'Dependency specification is invalid [{0}]: {1}'.format(dep, str(e))
-            raise exceptions.DependencyException(msg)
+        result = {}
+        for dep in deps:
+            try:
+                pkg = paludis.parse_user_package_dep_spec(dep, env, paludis.UserPackageDepSpecOptions())
+                # TODO Compare package version!
+                r = []
+                for i in installed.package_ids(str(pkg.package), []):
+                    r.append(str(i))
+                logger.debug('Checking is installed: {0} -> {1}'.format(pkg, repr(r)))
+                result[dep] = r
+            except paludis.BaseException as e:
+                msg = 'Dependency specification is invalid [{0}]: {1}'.format(dep, str(e))
+                raise exceptions.DependencyException(msg)
+        return result
+
+    @classmethod
+    def is_pkg_installed(cls, dep):
+        """Is a package managed by this manager installed?"""
+        return cls.are_pkgs_installed([dep])[dep]
 
     @classmethod
     def resolve(cls, *deps):
@@ -558,7 +1409,7 @@ class PaludisPackageManager(PackageManager, GentooPackageManager):
 
         logger.info('[paludis] Resolving dependencies ...')
 
-        env = paludis.EnvironmentFactory.instance.create('')
+        env = cls.get_env()
         fltr = paludis.Filter.And(paludis.Filter.SupportsInstallAction(), paludis.Filter.NotMasked())
         to_install = set()
         for dep in deps:
@@ -570,7 +1421,7 @@ class PaludisPackageManager(PackageManager, GentooPackageManager):
             for pkg in env[s]:
                 _to_install.add(str(pkg))
             if _to_install:
-                to_install += _to_install
+                to_install |= _to_install
             else:
                 msg = 'Package not found: {pkg}'.format(pkg=dep)
                 raise exceptions.DependencyException(msg)
@@ -578,6 +1429,184 @@ class PaludisPackageManager(PackageManager, GentooPackageManager):
         cls.throw_package_list(list(to_install))
 
 
+class InstalledPackagesIndex(object):
+    """Representation of installed packages index file.
+    The index remembers results of installed state checks between DevAssistant
+    invocations, so that they don't have to be run again on unchanged system. Results
+    are kept per package manager together with fingerprint of its package database
+    (see PackageManager.get_db_fingerprint) and they're all thrown away as soon as
+    the fingerprint changes. Once loaded, it has following structure:
+
+    {'YUMPackageManager':
+        # fingerprint of package database at the time of the checks
+        {'fingerprint': [['/var/lib/rpm/Packages', 1388530800.0], ...],
+         # results of installed state checks
+         'installed': {'foo': 'foo-1.0-1.fc20.noarch', 'bar': False}},
+     'PIPPackageManager': {...},
+     ...
+    }
+    """
+    def __init__(self, index_file=settings.PKG_INDEX_FILE):
+        self.index_file = index_file
+        self.index = None
+        # installed state of more managers may be checked concurrently
+        self.lock = threading.Lock()
+
+    def _load(self):
+        if self.index is not None:
+            return
+        self.index = {}
+        if os.path.exists(self.index_file):
+            try:
+                self.index = yaml_loader.YamlLoader.load_yaml_by_path(self.index_file) or {}
+            except (IOError, OSError, yaml.YAMLError) as e:
+                logger.debug('Failed to load installed packages index: {0}'.format(e))
+
+    def _save(self):
+        try:
+            if not os.path.exists(os.path.dirname(self.index_file)):
+                os.makedirs(os.path.dirname(self.index_file))
+            with open(self.index_file, 'w') as f:
+                yaml.dump(self.index, f, Dumper=Dumper)
+        except (IOError, OSError) as e:
+            logger.debug('Failed to save installed packages index: {0}'.format(e))
+
+    def are_pkgs_installed(self, pkg_mgr, pkgs):
+        """Returns the same as pkg_mgr.are_pkgs_installed(pkgs), but only queries
+        pkg_mgr for packages that are not in the index with current fingerprint.
+        """
+        fingerprint = pkg_mgr.get_db_fingerprint()
+        if fingerprint is None or not current_run.USE_CACHE:
+            return pkg_mgr.are_pkgs_installed(pkgs)
+
+        with self.lock:
+            self._load()
+            entry = self.index.get(pkg_mgr.__name__, {})
+            if entry.get('fingerprint') != fingerprint:
+                entry = {'fingerprint': fingerprint, 'installed': {}}
+            known = dict(entry['installed'])
+
+        to_query = [pkg for pkg in pkgs if pkg not in known]
+        for pkg in pkgs:
+            if pkg in known:
+                logger.debug('Using indexed installed state of {0}: {1}'.format(pkg, known[pkg]))
+        if to_query:
+            known.update(pkg_mgr.are_pkgs_installed(to_query))
+            with self.lock:
+                self.index[pkg_mgr.__name__] = {'fingerprint': fingerprint, 'installed': known}
+                self._save()
+
+        return dict([(pkg, known[pkg]) for pkg in pkgs])
+
+
+class ManagerProbes(object):
+    """Remembers which package managers work, so that each of them only gets probed once
+    per DevAssistant invocation. Working managers are also stored in a file with their
+    probe times and trusted for settings.PKG_MANAGERS_TTL seconds in other invocations.
+    Since probes depend on the environment (e.g. YUM works only if the "yum" module can be
+    imported by the running interpreter, managers are looked up in PATH), they are stored
+    separately for every combination of Python interpreter and PATH.
+    Once loaded, the file has following structure:
+
+    {'<sha1 of sys.executable and PATH>': {'YUMPackageManager': 1388530800.0,
+                                           'PIPPackageManager': 1388530800.0},
+     ...}
+    """
+    def __init__(self, probes_file=settings.PKG_MANAGERS_FILE, ttl=settings.PKG_MANAGERS_TTL):
+        self.probes_file = probes_file
+        self.ttl = ttl
+        # {manager name: True/False} for managers probed during this invocation
+        self.probed = {}
+        self.stored = None
+        self.lock = threading.Lock()
+
+    def _load(self):
+        if self.stored is not None:
+            return
+        self.stored = {}
+        if current_run.USE_CACHE and os.path.exists(self.probes_file):
+            try:
+                stored = yaml_loader.YamlLoader.load_yaml_by_path(self.probes_file) or {}
+                # drop probes stored in older format, not specific to environment
+                self.stored = dict([(k, v) for k, v in stored.items() if isinstance(v, dict)])
+            except (IOError, OSError, yaml.YAMLError, AttributeError) as e:
+                logger.debug('Failed to load package managers probes: {0}'.format(e))
+
+    def _save(self):
+        if not current_run.USE_CACHE:
+            return
+        try:
+            if not os.path.exists(os.path.dirname(self.probes_file)):
+                os.makedirs(os.path.dirname(self.probes_file))
+            with open(self.probes_file, 'w') as f:
+                yaml.dump(self.stored, f, Dumper=Dumper)
+        except (IOError, OSError) as e:
+            logger.debug('Failed to save package managers probes: {0}'.format(e))
+
+    @classmethod
+    def get_environment_key(cls):
+        env = '{0}\n{1}'.format(sys.executable, os.environ.get('PATH', ''))
+        return hashlib.sha1(env.encode('utf8')).hexdigest()
+
+    def works(self, pkg_mgr):
+        """Returns pkg_mgr.works(), probing it only if needed."""
+        name = pkg_mgr.__name__
+        with self.lock:
+            if name not in self.probed:
+                self._load()
+                stored = self.stored.setdefault(self.get_environment_key(), {})
+                probed_at = stored.get(name, None)
+                now = time.time()
+                if probed_at is not None and 0 <= now - probed_at < self.ttl:
+                    self.probed[name] = True
+                else:
+                    self.probed[name] = bool(pkg_mgr.works())
+                    # only working managers are stored, so that managers installed during
+                    # the time to live don't get ignored
+                    if self.probed[name]:
+                        stored[name] = now
+                    else:
+                        stored.pop(name, None)
+                    self._save()
+            return self.probed[name]
+
+    def forget(self):
+        """Forgets results of probes from this invocation (but keeps the stored ones)."""
+        with self.lock:
+            self.probed = {}
+
+
+class DependencyPlan(object):
+    """Collects dependencies of all types before their installed state is checked.
+    Dependencies are identified by canonical names given by their package managers
+    (see PackageManager.canonical_name), so that every package is listed only once,
+    in the order it was first seen; version constraints of dependencies on the same
+    package are merged (see PackageManager.merge_deps).
+    """
+    def __init__(self):
+        # {dep_t: {canonical name: dependency}}
+        self._plan = collections.OrderedDict()
+
+    def __contains__(self, dep_t):
+        return dep_t in self._plan
+
+    def add(self, dep_t, dep_l):
+        """Adds dependencies of given type to the plan."""
+        deps = self._plan.setdefault(dep_t, collections.OrderedDict())
+        mgr = managers[dep_t][0]
+        for dep in dep_l:
+            name = mgr.canonical_name(dep)
+            if name in deps:
+                deps[name] = mgr.merge_deps(deps[name], dep)
+            else:
+                deps[name] = dep
+
+    def get_plan(self):
+        """Returns ordered dict {dep_t: list of dependencies}."""
+        return collections.OrderedDict([(dep_t, list(deps.values()))
+                                        for dep_t, deps in self._plan.items()])
+
+
 class DependencyInstaller(object):
     """Installs all dependencies given to install() like this:
     - Calls _process_dependency for each dependency type, system dependencies always go first
@@ -587,26 +1616,42 @@ class DependencyInstaller(object):
       - For non-system dependency type (e.g. 'gem', 'pip'), it also adds a system dependency
         that has the ability to install these (e.g. rubygems, python-pip)
     - Calls _install_dependencies
-      - For each dependency type
-        - Gets proper manager to install it
-        - Resolves dependencies of those dependencies :)
-        - Installs the dependencies
+      - Gets proper manager for each dependency type
+      - Checks installed state of dependencies of all types concurrently
+      - Resolves dependencies of those dependencies of all types concurrently :)
+      - Asks user to confirm installation of all of them at once
+      - Installs the dependencies type by type, system dependencies first, while
+        packages of the following types are being prefetched
+      - Non-system dependencies whose manager only starts working after system
+        dependencies get installed (e.g. pip, that is installed as python-pip), are
+        processed once more the same way afterwards
     """
     # True if devassistant is installing dependencies and we can't interrupt the process
     install_lock = False
+    # index of installed packages shared by all instances
+    installed_index = InstalledPackagesIndex()
+    # results of probing which package managers work, shared by all instances
+    manager_probes = ManagerProbes()
+    # run-scoped installer that collects dependencies of all "dependencies" commands
+    # between barriers, so that they get installed in one transaction (see start_aggregating)
+    pending = None
 
     """Class for installing dependencies """
     def __init__(self):
-        # {package_manager_shorcut: ['list', 'of', 'dependencies']}
-        # we're using ordered dict to preserve the order that is used in
+        # we're using ordered plan to preserve the order that is used in
         # assistants; we also want system dependencies to always go first
-        self.dependencies = collections.OrderedDict()
+        self.plan = DependencyPlan()
+
+    @property
+    def dependencies(self):
+        """{package_manager_shorcut: ['list', 'of', 'dependencies']}"""
+        return self.plan.get_plan()
 
     def get_package_manager(self, dep_t):
         """Choose proper package manager and return it."""
         mgrs = managers.get(dep_t, [])
         for manager in mgrs:
-            if manager.works():
+            if self.manager_probes.works(manager):
                 return manager
         if not mgrs:
             err = 'No package manager for dependency type "{dep_t}"'.format(dep_t=dep_t)
@@ -617,7 +1662,7 @@ class DependencyInstaller(object):
             raise exceptions.NoPackageManagerOperationalException(err)
 
     def _process_dependency(self, dep_t, dep_l):
-        """Add dependencies into self.dependencies, possibly also adding system packages
+        """Add dependencies into self.plan, possibly also adding system packages
         that contain non-distro package managers (e.g. if someone wants to install
         dependencines with pip and pip is not present, it will get installed through
         RPM on RPM based systems, etc.
@@ -631,66 +1676,205 @@ class DependencyInstaller(object):
         # try to get list of distros where the dependency type is system type
         distro = settings.SYSTEM_DEPTYPES_SHORTCUTS.get(dep_t, None)
         if not distro: # non-distro dependency type
-            sysdep_t = self.get_system_deptype_shortcut()
-            # for now, just take the first manager that can install dep_t and install this manager
-            self._process_dependency(sysdep_t,
-                                     managers[dep_t][0].get_distro_dependencies(sysdep_t))
+            if dep_t not in self.plan:
+                sysdep_t = self.get_system_deptype_shortcut()
+                # for now, just take the first manager that can install dep_t and install
+                # this manager
+                self._process_dependency(sysdep_t,
+                                         managers[dep_t][0].get_distro_dependencies(sysdep_t))
         elif utils.get_distro_name() not in distro: # distro dependency type, but for another distro
             return
-        self.dependencies.setdefault(dep_t, [])
-        self.dependencies[dep_t].extend(dep_l)
+        self.plan.add(dep_t, dep_l)
+
+    def _ask_to_confirm(self, to_install):
+        """Asks user to confirm installation of packages of all given dependency types at once.
 
-    def _ask_to_confirm(self, pac_man, *to_install):
-        """ Return True if user wants to install packages, False otherwise """
+        Args:
+            to_install: ordered dict {pkg_mgr: list of packages to install}
+        Returns:
+            True if user wants to install packages, False otherwise
+        """
+        package_list = []
+        for pkgs in to_install.values():
+            package_list.extend(pkgs)
+        if len(to_install) == 1:
+            prompt = list(to_install.keys())[0].get_perm_prompt(package_list)
+        else:
+            counts = ['{num} {t}'.format(num=len(pkgs), t=pkg_mgr.shortcut)
+                      for pkg_mgr, pkgs in to_install.items()]
+            prompt = 'Installing {num} packages ({counts}). Is this ok?'.\
+                format(num=len(package_list), counts=', '.join(counts))
         ret = DialogHelper.ask_for_package_list_confirm(
-            prompt=pac_man.get_perm_prompt(to_install),
-            package_list=to_install,
+            prompt=prompt,
+            package_list=package_list,
         )
         return False if ret is False else True
 
+    def _check_installed(self, pkg_mgrs):
+        """Checks installed state of dependencies of all given types concurrently (the checks
+        are read-only and independent of each other).
+
+        Args:
+            pkg_mgrs: ordered dict {dep_t: package manager to use}
+        Returns:
+            dict {dep_t: list of dependencies that are not installed}
+        """
+        missing = {}
+        dependencies = self.dependencies
+
+        def check(dep_t, pkg_mgr):
+            dep_l = dependencies[dep_t]
+            installed = self.installed_index.are_pkgs_installed(pkg_mgr, dep_l)
+            missing[dep_t] = [dep for dep in dep_l if not installed[dep]]
+
+        self._run_concurrently(check, pkg_mgrs.items())
+        return missing
+
+    def _resolve(self, pkg_mgrs, missing):
+        """Resolves missing dependencies of all given types concurrently.
+
+        Args:
+            pkg_mgrs: ordered dict {dep_t: package manager to use}
+            missing: dict {dep_t: list of dependencies that are not installed}
+        Returns:
+            ordered dict {pkg_mgr: list of packages to install}, in order of pkg_mgrs
+        """
+        resolved = {}
+
+        def resolve(dep_t, pkg_mgr):
+            resolved[dep_t] = pkg_mgr.resolve(*missing[dep_t])
+
+        self._run_concurrently(resolve, [(dep_t, pkg_mgr) for dep_t, pkg_mgr in
+                                         pkg_mgrs.items() if missing[dep_t]])
+        return collections.OrderedDict([(pkg_mgr, resolved[dep_t]) for dep_t, pkg_mgr in
+                                        pkg_mgrs.items() if dep_t in resolved])
+
+    def _run_concurrently(self, func, args_list):
+        """Calls func(*args) for each of args in args_list, each in its own thread
+        (unless there is just one). Waits for all of them and raises the first exception
+        raised by any of them, if any.
+        """
+        args_list = list(args_list)
+        errors = []
+
+        def run(*args):
+            try:
+                func(*args)
+            except BaseException as e:
+                errors.append(e)
+
+        if len(args_list) == 1:
+            run(*args_list[0])
+        else:
+            threads = [threading.Thread(target=run, args=args) for args in args_list]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        if errors:
+            raise errors[0]
+
+    def _start_prefetching(self, to_install):
+        """Starts prefetching packages of given managers in background threads.
+
+        Args:
+            to_install: list of (pkg_mgr, list of packages to install) pairs
+        Returns:
+            dict {pkg_mgr: PrefetchThread}
+        """
+        threads = {}
+        for pkg_mgr, pkgs in to_install:
+            threads[pkg_mgr] = PrefetchThread(pkg_mgr, pkgs)
+            threads[pkg_mgr].start()
+        return threads
+
+    def _install_packages(self, pkg_mgr, to_install):
+        type(self).install_lock = True
+        # TODO: we should do this more systematically (send signal to cl/gui?)
+        logger.info('Installing dependencies, sit back and relax ...',
+                    extra={'event_type': 'dep_installation_start'})
+        if current_run.UI == 'cli': # TODO: maybe let every manager to decide when to start
+            event = threading.Event()
+            t = FakeProgressThread(event)
+            t.start()
+        installed = pkg_mgr.install(*to_install)
+        if current_run.UI == 'cli':
+            event.set()
+            t.join()
+        type(self).install_lock = False
+        # installed packages may have brought new package managers
+        self.manager_probes.forget()
+
+        log_extra = {'event_type': 'dep_installation_end'}
+        if not installed:
+            msg = 'Failed to install dependencies, exiting.'
+            logger.error(msg, extra=log_extra)
+            ex = exceptions.DependencyException(msg)
+            ex.already_logged = True
+            raise ex
+        else:
+            logger.info('Successfully installed dependencies!', extra=log_extra)
+
+    def _install_dependencies_by(self, pkg_mgrs):
+        """Checks installed state of dependencies of all given types, asks user to confirm
+        installation of all missing ones and installs them in order of given pkg_mgrs.
+        Packages of all managers but the first one are being prefetched while packages
+        of the preceding managers are being installed.
+
+        Args:
+            pkg_mgrs: ordered dict {dep_t: package manager to use}
+        """
+        missing = self._check_installed(pkg_mgrs)
+        to_install = self._resolve(pkg_mgrs, missing)
+        if not to_install:
+            # nothing to install, let's move on
+            return
+
+        confirm = self._ask_to_confirm(to_install)
+        if not confirm:
+            msg = 'List of packages denied by user, exiting.'
+            raise exceptions.DependencyException(msg)
+
+        prefetching = self._start_prefetching(list(to_install.items())[1:])
+        try:
+            for pkg_mgr, pkgs in to_install.items():
+                if pkg_mgr in prefetching:
+                    prefetching.pop(pkg_mgr).join()
+                self._install_packages(pkg_mgr, pkgs)
+        finally:
+            # if installation has failed, don't leave prefetched packages of the remaining
+            # managers behind for their next (unrelated) installation
+            for thread in prefetching.values():
+                thread.cancel()
+
     def _install_dependencies(self):
         """Install missing dependencies"""
+        pkg_mgrs = collections.OrderedDict()
+        # non-system managers that don't work yet - they may start working once
+        # system dependencies (e.g. python-pip) get installed
+        deferred = []
         for dep_t, dep_l in self.dependencies.items():
             if not dep_l:
                 continue
+            try:
+                pkg_mgrs[dep_t] = self.get_package_manager(dep_t)
+            except exceptions.NoPackageManagerOperationalException:
+                if managers[dep_t][0].is_system:
+                    raise
+                deferred.append(dep_t)
+
+        self._install_dependencies_by(pkg_mgrs)
+        for dep_t in deferred:
             pkg_mgr = self.get_package_manager(dep_t)
-            pkg_mgr.works()
-            to_resolve = []
-            for dep in dep_l:
-                if not pkg_mgr.is_pkg_installed(dep):
-                    to_resolve.append(dep)
-            if not to_resolve:
-                # nothing to install, let's move on
-                continue
-            to_install = pkg_mgr.resolve(*to_resolve)
-            confirm = self._ask_to_confirm(pkg_mgr, *to_install)
-            if not confirm:
-                msg = 'List of packages denied by user, exiting.'
-                raise exceptions.DependencyException(msg)
+            self._install_dependencies_by(collections.OrderedDict([(dep_t, pkg_mgr)]))
 
-            type(self).install_lock = True
-            # TODO: we should do this more systematically (send signal to cl/gui?)
-            logger.info('Installing dependencies, sit back and relax ...',
-                        extra={'event_type': 'dep_installation_start'})
-            if current_run.UI == 'cli': # TODO: maybe let every manager to decide when to start
-                event = threading.Event()
-                t = FakeProgressThread(event)
-                t.start()
-            installed = pkg_mgr.install(*to_install)
-            if current_run.UI == 'cli':
-                event.set()
-                t.join()
-            type(self).install_lock = False
-
-            log_extra = {'event_type': 'dep_installation_end'}
-            if not installed:
-                msg = 'Failed to install dependencies, exiting.'
-                logger.error(msg, extra=log_extra)
-                ex = exceptions.DependencyException(msg)
-                ex.already_logged = True
-                raise ex
-            else:
-                logger.info('Successfully installed dependencies!', extra=log_extra)
+    def add(self, struct):
+        """Adds dependencies specified by `struct` structure to the plan of this installer."""
+        # the system dependencies should always go first
+        self.plan.add(self.get_system_deptype_shortcut(), [])
+        for dep_dict in struct:
+            for dep_t, dep_l in dep_dict.items():
+                self._process_dependency(dep_t, dep_l)
 
     def install(self, struct):
         """
@@ -700,14 +1884,35 @@ class DependencyInstaller(object):
         not present on system (it uses package managers specified by `struct`
         structure)
         """
-        # the system dependencies should always go first
-        self.dependencies.setdefault(self.get_system_deptype_shortcut(), [])
-        for dep_dict in struct:
-            for dep_t, dep_l in dep_dict.items():
-                self._process_dependency(dep_t, dep_l)
+        self.add(struct)
         if self.dependencies:
             self._install_dependencies()
 
+    @classmethod
+    def start_aggregating(cls):
+        """Starts collecting dependencies of all "dependencies" commands of current run
+        into one pending installer instead of installing them right away. They get
+        installed in one transaction (with one confirmation and one invocation of each
+        package manager) at the next barrier - flush_pending() is called before running
+        any command that may need them and at the end of the run.
+        """
+        if cls.pending is None:
+            cls.pending = cls()
+
+    @classmethod
+    def flush_pending(cls):
+        """Installs dependencies collected since the last barrier (if aggregating)."""
+        if cls.pending is None:
+            return
+        pending, cls.pending = cls.pending, cls()
+        if pending.dependencies:
+            pending._install_dependencies()
+
+    @classmethod
+    def stop_aggregating(cls):
+        """Stops aggregating, dependencies that haven't been flushed are dropped."""
+        cls.pending = None
+
     def get_system_deptype_shortcut(self):
         distro = utils.get_distro_name()
         for k, v in settings.SYSTEM_DEPTYPES_SHORTCUTS.items():
@@ -717,6 +1922,38 @@ class DependencyInstaller(object):
         # just try rpm if unkown (not very nice?)
         return 'rpm'
 
+class PrefetchThread(threading.Thread):
+    """Prefetches given packages of given package manager (see PackageManager.prefetch)
+    in background. If it gets cancelled, the prefetched packages are discarded, even if
+    the prefetch only finishes after that.
+    """
+    def __init__(self, pkg_mgr, pkgs):
+        super(PrefetchThread, self).__init__()
+        # don't keep DevAssistant running for a download it won't use
+        self.daemon = True
+        self.pkg_mgr = pkg_mgr
+        self.pkgs = pkgs
+        self.lock = threading.Lock()
+        self.finished = False
+        self.cancelled = False
+
+    def run(self):
+        try:
+            self.pkg_mgr.prefetch(*self.pkgs)
+        except BaseException as e:
+            logger.debug('Failed to prefetch packages for {0}: {1}'.format(self.pkg_mgr, e))
+        with self.lock:
+            self.finished = True
+            if self.cancelled:
+                self.pkg_mgr.discard_prefetched()
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            if self.finished:
+                self.pkg_mgr.discard_prefetched()
+
+
 class FakeProgressThread(threading.Thread):
     def __init__(self, finish_event):
         super(FakeProgressThread, self).__init__()
@@ -1,6 +1,10 @@
 from devassistant import command
+from devassistant import command_runners
+from devassistant import current_run
 from devassistant.logger import logger
 from devassistant import exceptions
+from devassistant.generation_cache import GenerationCache
+from devassistant import package_managers
 from devassistant import utils
 from devassistant import yaml_assistant
 
@@ -36,30 +40,59 @@ class PathRunner(object):
             devassistant.exceptions.ExecutionException with a cause if something goes wrong
         """
         error = None
+        # project tree may be restored from generation cache instead of running run sections
+        gen_cache = GenerationCache.get(self.path, parsed_args)
+        snapshot = gen_cache.lookup() if gen_cache is not None else None
+        restored = False
+        # dependencies of the leaf assistant and of all dependencies commands in 'run' are
+        # installed together, until a command that may need them is run
+        if current_run.AGGREGATE_DEPENDENCIES:
+            package_managers.DependencyInstaller.start_aggregating()
         # run 'pre_run', 'logging', 'dependencies' and 'run'
         try: # serve as a central place for error logging
             self._logging(parsed_args)
-            if not 'deps_only' in parsed_args:
+            if not 'deps_only' in parsed_args and not snapshot:
                 self._run_path_run('pre', parsed_args)
             self._run_path_dependencies(parsed_args)
-            if not 'deps_only' in parsed_args:
+            if snapshot:
+                gen_cache.restore(snapshot)
+                restored = True
+            elif not 'deps_only' in parsed_args:
                 self._run_path_run('', parsed_args)
+            package_managers.DependencyInstaller.flush_pending()
         except exceptions.ExecutionException as e:
             if not getattr(e, 'already_logged', False):
                 # this is here primarily because of log_ command, that logs the message itself
                 logger.error(utils.u(e))
             error = e
+        finally:
+            package_managers.DependencyInstaller.stop_aggregating()
 
         # in any case, run post_run
         try: # serve as a central place for error logging
-            self._run_path_run('post', parsed_args)
+            if not restored:
+                self._run_path_run('post', parsed_args)
         except exceptions.ExecutionException as e:
             if not getattr(e, 'already_logged', False):
                 # this is here primarily because of log_ command, that logs the message itself
                 logger.error(utils.u(e))
             error = e
 
-        if error: raise error
+        try:
+            command_runners.DotDevassistantCommandRunner.sync()
+        except exceptions.ExecutionException as e:
+            logger.error(utils.u(e))
+            error = error or e
+
+        try:
+            if error: raise error
+            if gen_cache is not None and not snapshot:
+                try:
+                    gen_cache.store()
+                except (IOError, OSError) as e:
+                    logger.warning('Failed to store project in generation cache: {0}'.format(e))
+        finally:
+            GenerationCache.finish()
 
     def stop(self):
         for a in self.path:
@@ -17,6 +17,20 @@ SUBASSISTANT_PREFIX = 'subassistant'
 SUBASSISTANT_N_STRING = 'subassistant_{0}'
 DEPS_ONLY_FLAG = '--deps-only'
 CACHE_FILE = os.path.expanduser('~/.devassistant/.cache.yaml')
+PKG_INDEX_FILE = os.path.expanduser('~/.devassistant/.pkg_index.yaml')
+PKG_MANAGERS_FILE = os.path.expanduser('~/.devassistant/.pkg_managers.yaml')
+# how long (in seconds) to trust that a package manager works without probing it again
+PKG_MANAGERS_TTL = 600
+YUM_CACHE_DIR = os.path.expanduser('~/.devassistant/yum_cache')
+YUM_RESOLVED_FILE = os.path.expanduser('~/.devassistant/.yum_resolved.yaml')
+# compiled jinja2 templates, see Jinja2Runner
+JINJA_CACHE_DIR = os.path.expanduser('~/.devassistant/jinja_cache')
+# snapshots of generated projects, see GenerationCache; not used if not set
+GENERATION_CACHE_DIR = os.environ.get('DEVASSISTANT_GENERATION_CACHE', None)
+# local mirrors (pip wheelhouse, npm tarball cache) that are preferred when installing
+# packages and filled with every installed package; not used if not set
+PIP_MIRROR_DIR = os.environ.get('DEVASSISTANT_PIP_MIRROR', None)
+NPM_MIRROR_DIR = os.environ.get('DEVASSISTANT_NPM_MIRROR', None)
 DATA_DIRECTORIES = [os.path.join(os.path.dirname(__file__), 'data'),
                     '/usr/local/share/devassistant',
                     os.path.expanduser('~/.devassistant')]
@@ -1,22 +1,26 @@
-import copy
-
 from devassistant import loaded_yaml
+from devassistant import utils
 
 class Snippet(loaded_yaml.LoadedYaml):
+    """Snippet loaded from yaml. Its content is frozen (see utils.freeze), so all
+    sections are returned without copying; callers that need to modify them must
+    make a copy (copy.deepcopy or utils.thaw) first.
+    """
     def __init__(self, name, parsed_yaml, path):
         self.name = name
-        self.parsed_yaml = parsed_yaml
+        self.parsed_yaml = utils.freeze(parsed_yaml)
         self.path = path
 
     @property
     def args(self):
-        return copy.deepcopy(self.parsed_yaml.get('args', {}))
+        return self.parsed_yaml.get('args', utils.FrozenDict())
 
     def get_arg_by_name(self, name):
-        return self.args.get(name, {})
+        """Returns mutable copy of argument of given name ({} if there is no such)."""
+        return utils.thaw(self.args.get(name, {}))
 
     def get_run_section(self, section_name='run'):
-        return copy.deepcopy(self.parsed_yaml.get(section_name, None))
+        return self.parsed_yaml.get(section_name, None)
 
     def get_files_dir(self):
         return self.parsed_yaml.get('files_dir', self.default_files_dir_for('snippets'))
@@ -25,10 +29,10 @@ class Snippet(loaded_yaml.LoadedYaml):
         if not section_name in self.parsed_yaml:
             return None
         # we also want to include the basic "dependencies" section
-        deps = copy.deepcopy(self.parsed_yaml.get('dependencies', []))
+        deps = list(self.parsed_yaml.get('dependencies', []))
         if section_name != 'dependencies':
-            deps.extend(copy.deepcopy(self.parsed_yaml.get(section_name, [])))
+            deps.extend(self.parsed_yaml.get(section_name, []))
         return deps
 
     def get_files_section(self):
-        return copy.deepcopy(self.parsed_yaml.get('files', {}))
+        return self.parsed_yaml.get('files', utils.FrozenDict())
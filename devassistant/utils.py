@@ -1,5 +1,6 @@
 import os
 import platform
+import shutil
 
 try: # ugly hack for using imp instead of importlib on Python <= 2.6
     import importlib
@@ -14,6 +15,118 @@ except ImportError:
 def import_module(module):
     return importlib.import_module(module)
 
+def which(cmd):
+    """Returns full path to executable cmd found in $PATH (or cmd itself if it is
+    a path to an executable) or None if there is no such executable.
+    """
+    if os.path.dirname(cmd):
+        return cmd if os.path.isfile(cmd) and os.access(cmd, os.X_OK) else None
+    for d in os.environ.get('PATH', '').split(os.pathsep):
+        path = os.path.join(d, cmd)
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+def module_exists(name):
+    """Returns True if top-level module of given name can be imported, without
+    actually importing it.
+    """
+    try:
+        from importlib.util import find_spec
+    except ImportError: # Python 2
+        import imp
+        try:
+            imp.find_module(name)
+            return True
+        except ImportError:
+            return False
+    return find_spec(name) is not None
+
+def copy_file(src, dst):
+    """Copies contents and mode of file src to dst. The data are copied in kernel
+    if possible - by copy_file_range (which also creates reflinks on filesystems that
+    support them) or sendfile - and through userspace buffers only if neither works.
+    """
+    with open(src, 'rb') as fsrc:
+        with open(dst, 'wb') as fdst:
+            size = os.fstat(fsrc.fileno()).st_size
+            if not _copy_in_kernel(fsrc.fileno(), fdst.fileno(), size):
+                shutil.copyfileobj(fsrc, fdst)
+    shutil.copymode(src, dst)
+
+def _copy_in_kernel(infd, outfd, size):
+    """Returns True if the whole file was copied, False if it can't be done in kernel."""
+    for name in ['copy_file_range', 'sendfile']:
+        if not hasattr(os, name):
+            continue
+        offset = 0
+        try:
+            while offset < size:
+                if name == 'copy_file_range':
+                    sent = os.copy_file_range(infd, outfd, size - offset, offset)
+                else:
+                    sent = os.sendfile(outfd, infd, offset, size - offset)
+                if sent == 0: # file got shorter since we've checked its size
+                    break
+                offset += sent
+            return True
+        except OSError:
+            # unsupported for this file/filesystem, unless it failed in the middle
+            if offset:
+                raise
+    return False
+
+def _readonly(self, *args, **kwargs):
+    raise TypeError('{0} is read-only, use copy.copy or copy.deepcopy to get a mutable copy'.\
+            format(type(self).__name__))
+
+class FrozenDict(dict):
+    """Read-only dict, see freeze. Since it is a dict subclass, it passes all
+    isinstance(x, dict) checks. Both copy.copy and copy.deepcopy return mutable dicts.
+    """
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _readonly
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+    def __reduce__(self):
+        return (type(self), (dict(self), ))
+
+class FrozenList(list):
+    """Read-only list, see freeze and FrozenDict."""
+    __setitem__ = __delitem__ = __setslice__ = __delslice__ = __iadd__ = __imul__ = \
+        append = extend = insert = pop = remove = reverse = sort = _readonly
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+    def __reduce__(self):
+        return (type(self), (list(self), ))
+
+def freeze(struct):
+    """Returns given structure (as loaded from yaml) with all dicts and lists replaced
+    by their read-only counterparts, so that it can be shared without copying.
+    """
+    if isinstance(struct, dict):
+        return FrozenDict([(k, freeze(v)) for k, v in struct.items()])
+    elif isinstance(struct, list):
+        return FrozenList([freeze(i) for i in struct])
+    return struct
+
+def thaw(struct):
+    """Returns mutable deep copy of structure returned by freeze."""
+    if isinstance(struct, dict):
+        return dict([(k, thaw(v)) for k, v in struct.items()])
+    elif isinstance(struct, list):
+        return [thaw(i) for i in struct]
+    return struct
+
 def u(string):
     try:
         return unicode(string)
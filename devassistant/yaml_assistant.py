@@ -16,12 +16,15 @@ from devassistant import settings
 def needs_fully_loaded(method):
     """Wraps all publicly callable methods of YamlAssistant. If the assistant was loaded
     from cache, this decorator will fully load it first time a publicly callable method
-    is used.
+    is used. If possible, the assistant is loaded lazily - the source file is only scanned
+    for its sections and these are parsed when they are used.
     """
     @functools.wraps(method)
     def inner(self, *args, **kwargs):
         if not self.fully_loaded:
-            self.parsed_yaml = yaml_loader.YamlLoader.load_yaml_by_path(self.path).popitem()[1]
+            loaded = yaml_loader.YamlLoader.load_yaml_lazily_by_path(self.path) or \
+                yaml_loader.YamlLoader.load_yaml_by_path(self.path).popitem()
+            self.parsed_yaml = loaded[1]
             self.fully_loaded = True
         return method(self, *args, **kwargs)
 
@@ -40,6 +43,9 @@ class YamlAssistant(assistant_base.AssistantBase, loaded_yaml.LoadedYaml):
 
     @property
     def parsed_yaml(self):
+        if isinstance(self._parsed_yaml, yaml_loader.LazyYamlMapping):
+            # the lazy mapping is an implementation detail, users always get a plain dict
+            self._parsed_yaml = dict(self._parsed_yaml.items())
         return self._parsed_yaml
 
     @parsed_yaml.setter
@@ -56,15 +62,40 @@ class YamlAssistant(assistant_base.AssistantBase, loaded_yaml.LoadedYaml):
         self.files_dir = value.get('files_dir', self.default_files_dir_for('assistants'))
         self._files = value.get('files', {})
         self._logging = value.get('logging', [])
-        # set _run and _dependencies as empty in case assistant doesn't have them at all
-        self._dependencies = value.get('dependencies', [])
-        self._run = value.get('run', [])
-        # handle more dependencies* and run* sections
-        for k, v in value.items():
-            if k.startswith('run') or k.startswith('dependencies'):
-                setattr(self, '_{0}'.format(k), v)
-        self._pre_run = value.get('pre_run', [])
-        self._post_run = value.get('post_run', [])
+        # index of all run* and dependencies* sections (and pre_run, post_run) by name;
+        # names of dependencies_<arg> sections are also indexed by <arg>, see dependencies()
+        self._sections = {'dependencies': [], 'run': [], 'pre_run': [], 'post_run': []}
+        self._dependencies_by_arg = {}
+        # sections that weren't parsed yet, if value is yaml_loader.LazyYamlMapping
+        self._lazy_sections = set()
+        lazy = isinstance(value, yaml_loader.LazyYamlMapping)
+        for k in value.keys():
+            if k.startswith('run') or k.startswith('dependencies') or k in ['pre_run', 'post_run']:
+                self._set_section(k, None if lazy else value[k])
+                if lazy:
+                    self._lazy_sections.add(k)
+
+    def _set_section(self, name, section):
+        self._sections[name] = section
+        self._lazy_sections.discard(name)
+        if name.startswith('dependencies_'):
+            self._dependencies_by_arg[name[len('dependencies_'):]] = name
+
+    def _get_section(self, name, default=None):
+        if name in self._lazy_sections:
+            self._set_section(name, self._parsed_yaml[name])
+        return self._sections.get(name, default)
+
+    def _section_property(name):
+        """Returns property for direct access to section of given name."""
+        return property(lambda self: self._get_section(name),
+                        lambda self, section: self._set_section(name, section))
+
+    _run = _section_property('run')
+    _dependencies = _section_property('dependencies')
+    _pre_run = _section_property('pre_run')
+    _post_run = _section_property('post_run')
+    del _section_property
 
     @needs_fully_loaded
     def assert_fully_loaded(self):
@@ -96,7 +127,7 @@ class YamlAssistant(assistant_base.AssistantBase, loaded_yaml.LoadedYaml):
                 try:
                     problem = None
                     snippet = yaml_snippet_loader.YamlSnippetLoader.get_snippet_by_name(use_snippet)
-                    arg_params = dict(snippet.args.pop(arg_name), **arg_params)
+                    arg_params = dict(snippet.args[arg_name], **arg_params)
                 except exceptions.SnippetNotFoundException as e:
                     problem = 'Couldn\'t expand argument {arg} in assistant {a}: ' + str(e)
                 except KeyError as e: # snippet doesn't have the requested argument
@@ -108,7 +139,7 @@ class YamlAssistant(assistant_base.AssistantBase, loaded_yaml.LoadedYaml):
                                                   a=self.name))
                     continue
 
-                # this works much like snippet.args.pop(arg_name).update(arg_params),
+                # this works much like snippet.get_arg_by_name(arg_name).update(arg_params),
                 # but unlike it, this actually returns the updated dict
 
             arg = argument.Argument(arg_name, *arg_params.pop('flags'), **arg_params)
@@ -167,18 +198,18 @@ class YamlAssistant(assistant_base.AssistantBase, loaded_yaml.LoadedYaml):
         if not kwargs: kwargs = {}
 
         self.proper_kwargs('dependencies', kwargs)
-        sections = [getattr(self, '_dependencies', [])]
+        sections = [self._dependencies]
         if self.role == 'mod':
             # if subassistant_path is "foo bar baz", then search for dependency sections
-            # _dependencies_foo, _dependencies_foo_bar, _dependencies_foo_bar_baz
+            # dependencies_foo, dependencies_foo_bar, dependencies_foo_bar_baz
             for i in range(1, len(kwargs.get('subassistant_path', [])) + 1):
-                possible_dep_section = '_dependencies_{0}'.format('_'.join(kwargs['subassistant_path'][:i]))
-                if possible_dep_section in dir(self):
-                    sections.append(getattr(self, possible_dep_section))
+                possible_dep_section = '_'.join(kwargs['subassistant_path'][:i])
+                if possible_dep_section in self._dependencies_by_arg:
+                    sections.append(self._get_section(self._dependencies_by_arg[possible_dep_section]))
         # install these dependencies in any case
-        for arg in kwargs:
-            if '_dependencies_{0}'.format(arg) in dir(self):
-                sections.append(getattr(self, '_dependencies_{0}'.format(arg)))
+        for arg, section_name in self._dependencies_by_arg.items():
+            if arg in kwargs:
+                sections.append(self._get_section(section_name))
 
         deps = []
 
@@ -194,20 +225,25 @@ class YamlAssistant(assistant_base.AssistantBase, loaded_yaml.LoadedYaml):
         if not kwargs: kwargs = {}
 
         self.proper_kwargs('run', kwargs)
-        to_run = '_run'
+        to_run = 'run'
         if stage: # if we have stage, always use that
-            to_run = '_' + stage + '_run'
+            to_run = stage + '_run'
         elif self.role == 'mod':
             # try to get a section to run from the most specialized one to the least specialized one
             # e.g. first run_python_django, then run_python and then just run
             sa_path = kwargs.get('subassistant_path', [])
             for i in range(len(sa_path), -1, -1):
-                possible_run = '_'.join(['_run'] + sa_path[:i])
-                if hasattr(self, possible_run):
+                possible_run = '_'.join(['run'] + sa_path[:i])
+                if possible_run in self._sections:
                     to_run = possible_run
                     break
 
-        lang.run_section(getattr(self, to_run, {}), kwargs, runner=self)
+        lang.run_section(self._get_section(to_run, {}), kwargs, runner=self)
+
+    @needs_fully_loaded
+    def get_section(self, section_name):
+        """Returns run*/dependencies* section of given name or None if there is no such."""
+        return self._get_section(section_name)
 
     @needs_fully_loaded
     def stop(self):
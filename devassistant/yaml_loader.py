@@ -9,6 +9,41 @@ except:
 
 from devassistant.logger import logger
 
+class LazyYamlMapping(object):
+    """Read-only mapping of keys of a yaml mapping to their values. Every value is only
+    parsed from its own part of the yaml file when it is accessed for the first time,
+    see YamlLoader.load_yaml_lazily_by_path.
+    """
+    def __init__(self, text, offsets):
+        self._text = text
+        # {key: (start, end)} - offsets of "key: value" parts of text
+        self._offsets = offsets
+        self._loaded = {}
+
+    def __getitem__(self, key):
+        if key not in self._loaded:
+            start, end = self._offsets[key]
+            self._loaded[key] = list(yaml.load(self._text[start:end], Loader=Loader).values())[0]
+        return self._loaded[key]
+
+    def __contains__(self, key):
+        return key in self._offsets
+
+    def __iter__(self):
+        return iter(self._offsets)
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def keys(self):
+        return list(self._offsets)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def items(self):
+        return [(k, self[k]) for k in self]
+
 class YamlLoader(object):
     @classmethod
     def load_all_yamls(cls, directories):
@@ -55,6 +90,63 @@ class YamlLoader(object):
 
         return None
 
+    @classmethod
+    def load_yaml_lazily_by_path(cls, path):
+        """Load a yaml file that is at given path and consists of a single mapping of name
+        to another block mapping (like assistants do) lazily - it is only scanned for
+        boundaries of the items of the inner mapping, which are parsed on first access.
+
+        Returns:
+            tuple (name, LazyYamlMapping) or None if the file can't be loaded lazily (e.g.
+            it has different structure, uses aliases or isn't valid yaml) - use
+            load_yaml_by_path for it then
+        """
+        with open(path, 'r') as f:
+            text = f.read()
+        name = None
+        keys = []
+        starts = []
+        end = None
+        depth = 0
+        toplevel_nodes = 0
+        is_key = True
+        try:
+            for event in yaml.parse(text, Loader=Loader):
+                if isinstance(event, yaml.AliasEvent):
+                    # anchors may be defined in a different item
+                    return None
+                if isinstance(event, (yaml.ScalarEvent, yaml.CollectionStartEvent)):
+                    if depth == 1:
+                        toplevel_nodes += 1
+                        if toplevel_nodes == 1 and isinstance(event, yaml.ScalarEvent):
+                            name = event.value
+                        elif toplevel_nodes != 2 or not isinstance(event, yaml.MappingStartEvent) \
+                                or event.flow_style:
+                            return None
+                    elif depth == 2:
+                        if is_key:
+                            # every item must start on its own line, so that it can be parsed
+                            # separately (as a mapping with the same indentation)
+                            line_start = event.start_mark.index - event.start_mark.column
+                            if not isinstance(event, yaml.ScalarEvent) or \
+                                    text[line_start:event.start_mark.index].strip():
+                                return None
+                            keys.append(event.value)
+                            starts.append(line_start)
+                        is_key = not is_key
+                if isinstance(event, yaml.CollectionStartEvent):
+                    depth += 1
+                elif isinstance(event, yaml.CollectionEndEvent):
+                    depth -= 1
+                    if depth == 1:
+                        end = event.start_mark.index
+        except yaml.YAMLError:
+            return None
+        if end is None:
+            return None
+
+        return (name, LazyYamlMapping(text, dict(zip(keys, zip(starts, starts[1:] + [end])))))
+
     @classmethod
     def load_yaml_by_path(cls, path):
         """Load a yaml file that is at given path"""
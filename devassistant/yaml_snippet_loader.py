@@ -7,27 +7,71 @@ from devassistant import snippet
 
 class YamlSnippetLoader(object):
     snippets_dirs = list(map(lambda x: os.path.join(x, 'snippets'), settings.DATA_DIRECTORIES))
+    # loaded snippets - {name: snippet}
     _snippets = {}
+    # paths of all snippets in snippets_dirs - {name: [paths in order of snippets_dirs]}
+    _index = None
+    # snippets_dirs that _index was built from and mtimes of all their (sub)directories
+    _index_dirs = None
+    _index_mtimes = {}
+    # names of snippets that don't exist (according to current _index)
+    _missing = set()
 
     @classmethod
-    def _find_snippet(cls, name):
-        for snip in cls._snippets.values():
-            if snip.name == name: return snip
+    def _get_mtime(cls, path):
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return None
 
-        return None
+    @classmethod
+    def _build_index(cls):
+        """Scans all snippets_dirs for snippets at once."""
+        index = {}
+        mtimes = {}
+        for d in cls.snippets_dirs:
+            mtimes[d] = cls._get_mtime(d)
+            for dirname, subdirs, files in os.walk(d):
+                mtimes[dirname] = cls._get_mtime(dirname)
+                for f in filter(lambda x: x.endswith('.yaml'), files):
+                    path = os.path.join(dirname, f)
+                    name = os.path.relpath(path, d)[:-len('.yaml')]
+                    index.setdefault(name, []).append(path)
+        cls._index = index
+        cls._index_dirs = list(cls.snippets_dirs)
+        cls._index_mtimes = mtimes
+        cls._missing = set()
+
+    @classmethod
+    def _index_is_current(cls):
+        """Returns True if no snippet could have been added or removed since _index was
+        built (none of the scanned directories has changed).
+        """
+        if cls._index is None or cls._index_dirs != cls.snippets_dirs:
+            return False
+        for d, mtime in cls._index_mtimes.items():
+            if cls._get_mtime(d) != mtime:
+                return False
+        return True
 
     @classmethod
     def get_snippet_by_name(cls, name):
-        found = cls._find_snippet(name)
-        if found != None:
-            return found
-        loaded = yaml_loader.YamlLoader.load_yaml_by_relpath(cls.snippets_dirs, name + '.yaml')
-        if loaded:
-            path, parsed_yaml = loaded
-            snip = snippet.Snippet(name,
-                                   parsed_yaml,
-                                   path)
-            cls._snippets[snip.path] = snip
-            return snip
+        if name in cls._snippets:
+            return cls._snippets[name]
+        # both unknown names and negative entries are only rechecked if any of the
+        # snippets_dirs has changed
+        if (name in cls._missing or name not in (cls._index or {})) and \
+                not cls._index_is_current():
+            cls._build_index()
+        if name not in cls._missing:
+            for path in cls._index.get(name, []):
+                parsed_yaml = yaml_loader.YamlLoader.load_yaml_by_path(path)
+                if parsed_yaml is not None:
+                    snip = snippet.Snippet(name,
+                                           parsed_yaml,
+                                           path)
+                    cls._snippets[name] = snip
+                    return snip
+            cls._missing.add(name)
 
         raise exceptions.SnippetNotFoundException('no such snippet: {name}'.format(name=name))
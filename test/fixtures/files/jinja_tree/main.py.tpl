@@ -0,0 +1 @@
+print("{{ what }}")
\ No newline at end of file
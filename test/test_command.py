@@ -24,6 +24,18 @@ class TestCommand(object):
         assert Command('cl', True, {}).format_str() == 'true'
         assert Command('cl', False, {}).format_str() == 'false'
 
+    @pytest.mark.parametrize(('comm_type', 'result'), [
+        ('cl', True),
+        ('cl_i', True),
+        ('dda_c', True),
+        ('dependencies', False),
+        ('dda_dependencies', False),
+        ('call', False),
+        ('log_i', False),
+    ])
+    def test_is_barrier(self, comm_type, result):
+        assert Command(comm_type, 'foo', {}).is_barrier() == result
+
     def test_format_str_preserves_whitespace(self):
         c = "  eggs   spam    beans  "
         assert Command('log_i', c, {}).format_str() == c
@@ -1,8 +1,9 @@
 import os
 
 import pytest
+from flexmock import flexmock
 
-from devassistant.command_helpers import ClHelper
+from devassistant.command_helpers import ClHelper, SCLShell
 from devassistant.exceptions import ClException
 
 from test.logger import TestLoggingHandler
@@ -38,3 +39,63 @@ class TestClHelper(object):
         except ClException as e:
             assert 'script really ran' in e.output
             assert '\n\n' not in e.output
+
+
+class TestSCLShell(object):
+    def setup_method(self, method):
+        # we can't rely on scl being installed, so just run plain bash
+        flexmock(SCLShell).should_receive('get_shell_cmd').and_return('bash')
+        self.scls = ['enable', 'foo']
+        ClHelper.open_scl_shell(self.scls)
+
+    def teardown_method(self, method):
+        ClHelper.close_scl_shell(self.scls)
+
+    def test_command_runs_in_scl_shell(self):
+        assert ClHelper._can_use_scl_shell('echo foo', self.scls, False)
+        assert ClHelper.run_command('echo foo', scls=self.scls) == 'foo'
+        assert ClHelper.scl_shells[tuple(self.scls)].is_running()
+
+    def test_shell_is_reused(self):
+        ClHelper.run_command('echo $$', scls=self.scls)
+        shell = ClHelper.scl_shells[tuple(self.scls)]
+        pid = shell.proc.pid
+        ClHelper.run_command('echo bar', scls=self.scls)
+        assert shell.proc.pid == pid
+
+    def test_output_without_trailing_newline(self):
+        assert ClHelper.run_command('printf "foo\\nbar"', scls=self.scls) == 'foo\nbar'
+
+    def test_failed_command_raises(self):
+        with pytest.raises(ClException) as excinfo:
+            ClHelper.run_command('echo spam; exit 3', scls=self.scls)
+        assert excinfo.value.returncode == 3
+        assert excinfo.value.output == 'spam'
+        # exit in a command doesn't terminate the shell
+        assert ClHelper.run_command('echo foo', scls=self.scls) == 'foo'
+
+    def test_command_with_syntax_error_raises(self):
+        with pytest.raises(ClException) as excinfo:
+            ClHelper.run_command('echo "foo', scls=self.scls)
+        assert excinfo.value.returncode == 2
+        # the shell isn't waiting for rest of the command
+        assert ClHelper.run_command('echo foo', scls=self.scls) == 'foo'
+
+    def test_command_runs_in_current_directory(self, tmpdir):
+        cwd = os.getcwd()
+        try:
+            os.chdir(tmpdir.strpath)
+            assert ClHelper.run_command('pwd', scls=self.scls) == os.getcwd()
+        finally:
+            os.chdir(cwd)
+
+    def test_shell_closed_when_unused(self):
+        ClHelper.open_scl_shell(self.scls)
+        ClHelper.run_command('true', scls=self.scls)
+        shell = ClHelper.scl_shells[tuple(self.scls)]
+        ClHelper.close_scl_shell(self.scls)
+        assert shell.is_running()
+        ClHelper.close_scl_shell(self.scls)
+        assert not shell.is_running()
+        assert tuple(self.scls) not in ClHelper.scl_shells
+        ClHelper.open_scl_shell(self.scls)
@@ -1,13 +1,21 @@
 import os
+import shutil
 import sys
+import tempfile
 
+import jinja2
 import pytest
+import yaml
 from flexmock import flexmock
 
 from devassistant.command import Command
 from devassistant.command_helpers import DialogHelper
-from devassistant.command_runners import AskCommandRunner, CallCommandRunner, Jinja2Runner
+from devassistant.command_runners import AskCommandRunner, CallCommandRunner, Jinja2Runner, \
+    DotDevassistantCommandRunner
 from devassistant.exceptions import CommandException, YamlSyntaxError
+from devassistant.package_managers import DependencyInstaller
+from devassistant import settings
+from devassistant import utils
 
 
 class TestAskCommandRunner(object):
@@ -83,11 +91,128 @@ class TestCallCommandRunner(object):
 class TestClCommandRunner(object):
     pass
 
+class TestCopyFilesCommandRunner(object):
+    def setup_method(self, method):
+        self.filesdir = os.path.join(os.path.dirname(__file__), 'fixtures', 'files')
+
+    def test_copies_references_globs_and_dirs(self, tmpdir):
+        dest = tmpdir.join('dest')
+        c = Command('copy_files',
+                    {'files': [{'source': 'jinja_template.py'}, 'jinja_tree/sub/*.sh',
+                               'jinja_tree'],
+                     'destination': dest.strpath},
+                    kwargs={'__files_dir__': [self.filesdir]})
+        assert c.run() == [True, 'success']
+        assert dest.join('jinja_template.py').read() == \
+            open(os.path.join(self.filesdir, 'jinja_template.py')).read()
+        assert os.access(dest.join('static.sh').strpath, os.X_OK)
+        assert dest.join('jinja_tree', 'main.py.tpl').check()
+        assert os.access(dest.join('jinja_tree', 'sub', 'static.sh').strpath, os.X_OK)
+
+    def test_doesnt_overwrite(self, tmpdir):
+        tmpdir.join('jinja_template.py').write('original')
+        c = Command('copy_files',
+                    {'files': ['jinja_template.py.tpl', 'jinja_template.py'],
+                     'destination': tmpdir.strpath},
+                    kwargs={'__files_dir__': [self.filesdir]})
+        with pytest.raises(CommandException):
+            c.run()
+        assert tmpdir.join('jinja_template.py').read() == 'original'
+        assert not tmpdir.join('jinja_template.py.tpl').check()
+
+    def test_missing_file(self, tmpdir):
+        c = Command('copy_files', {'files': 'nope', 'destination': tmpdir.strpath},
+                    kwargs={'__files_dir__': [self.filesdir]})
+        with pytest.raises(CommandException):
+            c.run()
+
+    def test_copy_without_kernel_support(self, tmpdir):
+        flexmock(utils).should_receive('_copy_in_kernel').and_return(False)
+        src = tmpdir.join('src')
+        src.write('x' * 100000)
+        utils.copy_file(src.strpath, tmpdir.join('dst').strpath)
+        assert tmpdir.join('dst').read() == src.read()
+
 class TestDependenciesCommandRunner(object):
-    pass
+    def teardown_method(self, method):
+        DependencyInstaller.stop_aggregating()
+
+    def test_installs_right_away(self):
+        flexmock(DependencyInstaller).should_receive('install').with_args([{'rpm': ['foo']}]).once()
+        Command('dependencies', [{'rpm': ['foo']}], {}).run()
+
+    def test_aggregates_until_barrier(self):
+        DependencyInstaller.start_aggregating()
+        flexmock(DependencyInstaller).should_receive('get_system_deptype_shortcut').\
+            and_return('rpm')
+        flexmock(utils).should_receive('get_distro_name').and_return('fedora')
+        flexmock(DependencyInstaller).should_receive('install').never()
+        installed = []
+        flexmock(DependencyInstaller).should_receive('_install_dependencies').\
+            replace_with(lambda: installed.append(DependencyInstaller.pending.dependencies))
+        Command('dependencies', [{'rpm': ['foo', 'bar']}], {}).run()
+        Command('dependencies', [{'rpm': ['bar', 'baz']}], {}).run()
+        assert installed == []
+
+        pending = DependencyInstaller.pending
+        flexmock(pending).should_receive('_install_dependencies').once()
+        Command('cl', 'true', {}).run()
+        assert pending.dependencies['rpm'] == ['foo', 'bar', 'baz']
+        assert DependencyInstaller.pending is not pending
+        assert not DependencyInstaller.pending.dependencies
 
 class TestDotDevassistantCommandRunner(object):
-    pass
+    def setup_method(self, method):
+        self.ddcr = DotDevassistantCommandRunner
+        self.ddcr._documents = {}
+        self.ddcr._dirty = set()
+
+    def test_writes_are_batched(self, tmpdir):
+        dda = tmpdir.join('.devassistant')
+        dda.write('devassistant_version: 0.8.0\noriginal_kwargs: {name: foo}\n')
+        Command('dda_w', [tmpdir.strpath, {'foo': 'bar'}], {}).run()
+        Command('dda_w', [tmpdir.strpath, {'spam': 'eggs'}], {}).run()
+        kwargs = {}
+        Command('dda_r', tmpdir.strpath, kwargs).run()
+        assert kwargs['foo'] == 'bar' and kwargs['spam'] == 'eggs'
+        assert 'spam' not in dda.read()
+
+        self.ddcr.sync()
+        assert yaml.load(dda.read(), Loader=yaml.SafeLoader) == \
+            {'devassistant_version': '0.8.0', 'original_kwargs': {'name': 'foo'},
+             'foo': 'bar', 'spam': 'eggs'}
+        assert not tmpdir.join('.devassistant.tmp').check()
+
+    def test_other_command_syncs(self, tmpdir):
+        tmpdir.join('.devassistant').write('foo: bar\n')
+        Command('dda_w', [tmpdir.strpath, {'spam': 'eggs'}], {}).run()
+        out = Command('cl', 'cat {0}'.format(tmpdir.join('.devassistant').strpath), {}).run()
+        assert 'spam: eggs' in out[1]
+
+    def test_reads_are_cached(self, tmpdir):
+        dda = tmpdir.join('.devassistant')
+        dda.write('foo: bar\n')
+        flexmock(yaml).should_call('load').once()
+        for i in range(3):
+            kwargs = {}
+            Command('dda_r', tmpdir.strpath, kwargs).run()
+            assert kwargs['foo'] == 'bar'
+            # kwargs don't share anything with the cached document
+            kwargs['foo'] = 'spam'
+
+    def test_changed_file_is_read_again(self, tmpdir):
+        dda = tmpdir.join('.devassistant')
+        dda.write('foo: bar\n')
+        kwargs = {}
+        Command('dda_r', tmpdir.strpath, kwargs).run()
+        dda.write('foo: spam\nbaz: 1\n')
+        kwargs = {}
+        Command('dda_r', tmpdir.strpath, kwargs).run()
+        assert kwargs['foo'] == 'spam'
+
+    def test_missing_file(self, tmpdir):
+        with pytest.raises(CommandException):
+            Command('dda_r', tmpdir.strpath, {}).run()
 
 class TestGitHubCommandRunner(object):
     pass
@@ -96,6 +221,17 @@ class TestJinja2CommandRunner(object):
     def setup_method(self, method):
         self.jr = Jinja2Runner
         self.filesdir = os.path.join(os.path.dirname(__file__), 'fixtures', 'files')
+        # don't write compiled templates to ~/.devassistant and don't share environments
+        # (and their bytecode caches) between tests
+        self.orig_cache_dir = settings.JINJA_CACHE_DIR
+        self.cache_dir = tempfile.mkdtemp()
+        settings.JINJA_CACHE_DIR = self.cache_dir
+        self.jr._envs = {}
+
+    def teardown_method(self, method):
+        settings.JINJA_CACHE_DIR = self.orig_cache_dir
+        shutil.rmtree(self.cache_dir)
+        self.jr._envs = {}
 
     def is_file_exists(self, tmpdir, f):
         return os.path.isfile(os.path.join(tmpdir.strpath, f))
@@ -151,6 +287,70 @@ class TestJinja2CommandRunner(object):
         c.run()
         assert self.is_file_exists(tmpdir, fn) and self.get_file_contents(tmpdir, fn) == 'print("foo")'
 
+    def test_env_is_shared_and_caches_bytecode(self, tmpdir):
+        for fn in ['first.py', 'second.py']:
+            Command('jinja_render',
+                    {'template': {'source': 'jinja_template.py.tpl'},
+                     'data': {'what': 'foo'},
+                     'output': fn,
+                     'destination': tmpdir.strpath},
+                    kwargs={'__files_dir__': [self.filesdir]}).run()
+            assert self.get_file_contents(tmpdir, fn) == 'print("foo")'
+        assert list(self.jr._envs.keys()) == [self.filesdir]
+        assert len(os.listdir(self.cache_dir)) == 1
+
+    def test_render_streams_output(self, tmpdir):
+        flexmock(jinja2.Template).should_receive('render').never()
+        c = Command('jinja_render',
+                    {'template': {'source': 'jinja_tree/sub/list.txt.tpl'},
+                     'data': {'what': 'foo'},
+                     'output': 'list.txt',
+                     'destination': tmpdir.strpath},
+                    kwargs={'__files_dir__': [self.filesdir]})
+        c.run()
+        assert self.get_file_contents(tmpdir, 'list.txt') == 'foo0\nfoo1\nfoo2\n'
+
+    def test_render_dir(self, tmpdir):
+        c = Command('jinja_render_dir',
+                    {'template': {'source': 'jinja_tree'},
+                     'data': {'what': 'foo'},
+                     'output': 'project',
+                     'destination': tmpdir.strpath},
+                    kwargs={'__files_dir__': [self.filesdir]})
+        assert c.run() == (True, 'success')
+        project = tmpdir.join('project')
+        assert project.join('main.py').read() == 'print("foo")'
+        assert project.join('sub', 'list.txt').read() == 'foo0\nfoo1\nfoo2\n'
+        # non-templates are copied as they are, including mode
+        static = project.join('sub', 'static.sh')
+        assert static.read() == '#!/bin/sh\necho "{{ what }}"\n'
+        assert os.access(static.strpath, os.X_OK)
+        assert sorted([p.basename for p in project.visit()]) == \
+            ['list.txt', 'main.py', 'static.sh', 'sub']
+
+    def test_render_dir_doesnt_overwrite(self, tmpdir):
+        tmpdir.join('main.py').write('original')
+        c = Command('jinja_render_dir',
+                    {'template': {'source': 'jinja_tree'},
+                     'data': {'what': 'foo'},
+                     'destination': tmpdir.strpath},
+                    kwargs={'__files_dir__': [self.filesdir]})
+        with pytest.raises(CommandException):
+            c.run()
+        assert tmpdir.join('main.py').read() == 'original'
+        assert not tmpdir.join('sub').check()
+
+    def test_render_dir_wraps_io_errors(self, tmpdir):
+        flexmock(shutil).should_receive('copyfile').and_raise(IOError('disk full'))
+        c = Command('jinja_render_dir',
+                    {'template': {'source': 'jinja_tree'},
+                     'data': {'what': 'foo'},
+                     'destination': tmpdir.strpath},
+                    kwargs={'__files_dir__': [self.filesdir]})
+        with pytest.raises(CommandException) as excinfo:
+            c.run()
+        assert 'Failed to render templates: disk full' in str(excinfo.value)
+
 class TestLogCommandRunner(object):
     pass
 
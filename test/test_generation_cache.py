@@ -0,0 +1,98 @@
+import os
+
+import pytest
+from flexmock import flexmock
+
+from devassistant import current_run
+from devassistant.generation_cache import GenerationCache
+from devassistant import settings
+
+class TestGenerationCache(object):
+    def setup_method(self, method):
+        GenerationCache.finish()
+
+    def teardown_method(self, method):
+        GenerationCache.finish()
+
+    @pytest.fixture
+    def env(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(settings, 'GENERATION_CACHE_DIR', tmpdir.join('cache').strpath)
+        monkeypatch.setattr(current_run, 'USE_CACHE', True)
+        assistant = tmpdir.join('python.yaml')
+        assistant.write('python: {}')
+        files_dir = tmpdir.mkdir('files')
+        files_dir.join('setup.py').write('setup()')
+        path = [flexmock(name='crt'), flexmock(name='python', path=assistant.strpath,
+                                               files_dir=files_dir.strpath)]
+        return tmpdir, path
+
+    def make_project(self, tmpdir):
+        project = tmpdir.mkdir('project')
+        project.mkdir('src').join('foo.py').write('print("foo")')
+        return project
+
+    def test_not_used_if_not_configured(self, env, monkeypatch):
+        tmpdir, path = env
+        monkeypatch.setattr(settings, 'GENERATION_CACHE_DIR', None)
+        assert GenerationCache.get(path, {'name': tmpdir.join('p').strpath}) is None
+
+    def test_not_used_without_new_project(self, env):
+        tmpdir, path = env
+        assert GenerationCache.get(path, {}) is None
+        assert GenerationCache.get(path, {'name': tmpdir.strpath}) is None
+        assert GenerationCache.get(path, {'name': 'p', 'deps_only': True}) is None
+
+    def test_sourcefiles_only_recorded_for_active_cache(self, env):
+        tmpdir, path = env
+        GenerationCache.add_sourcefile('/foo/snippet.yaml')
+        assert GenerationCache.sourcefiles is None
+        GenerationCache.get(path, {'name': tmpdir.join('p').strpath})
+        GenerationCache.add_sourcefile('/foo/snippet.yaml')
+        assert '/foo/snippet.yaml' in GenerationCache.sourcefiles
+        # next run without cache doesn't record anything
+        assert GenerationCache.get(path, {}) is None
+        GenerationCache.add_sourcefile('/foo/snippet.yaml')
+        assert GenerationCache.sourcefiles is None
+
+    def test_store_and_restore(self, env):
+        tmpdir, path = env
+        args = {'name': tmpdir.join('project').strpath, 'eclipse': None}
+        cache = GenerationCache.get(path, args)
+        assert cache.lookup() is None
+        project = self.make_project(tmpdir)
+        cache.store()
+
+        project.remove()
+        cache = GenerationCache.get(path, args)
+        snapshot = cache.lookup()
+        assert snapshot and os.path.isfile(snapshot)
+        cache.restore(snapshot)
+        assert project.join('src', 'foo.py').read() == 'print("foo")'
+
+        # different arguments don't match
+        project.remove()
+        args['eclipse'] = True
+        assert GenerationCache.get(path, args).lookup() is None
+
+    def test_changed_sourcefile_invalidates(self, env):
+        tmpdir, path = env
+        args = {'name': tmpdir.join('project').strpath}
+        cache = GenerationCache.get(path, args)
+        snippet = tmpdir.join('snippet.yaml')
+        snippet.write('run: []')
+        GenerationCache.add_sourcefile(snippet.strpath)
+        self.make_project(tmpdir)
+        cache.store()
+        tmpdir.join('project').remove()
+
+        assert GenerationCache.get(path, args).lookup()
+        snippet.write('run: [{cl: ls}]')
+        assert GenerationCache.get(path, args).lookup() is None
+
+    def test_corrupted_record_is_ignored(self, env):
+        tmpdir, path = env
+        cache = GenerationCache.get(path, {'name': tmpdir.join('project').strpath})
+        tmpdir.mkdir('cache')
+        with open(cache.record_file, 'w') as f:
+            f.write('archive: [unclosed')
+        assert cache.lookup() is None
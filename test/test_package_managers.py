@@ -0,0 +1,687 @@
+import collections
+import os
+import site
+import sys
+import threading
+
+import pytest
+from flexmock import flexmock
+
+from devassistant.command_helpers import ClHelper, DialogHelper
+from devassistant.exceptions import ClException, DependencyException, \
+    NoPackageManagerOperationalException
+from devassistant.package_managers import PackageManager, YUMPackageManager, DNFPackageManager, \
+    PacmanPackageManager, \
+    PIPPackageManager, NPMPackageManager, EmergePackageManager, PaludisPackageManager, \
+    InstalledPackagesIndex, ManagerProbes, DependencyInstaller, DependencyPlan, \
+    PrefetchThread
+from devassistant import settings
+from devassistant import utils
+
+
+class TestPackageManager(object):
+    def test_are_pkgs_installed_defaults_to_is_pkg_installed(self):
+        flexmock(PackageManager).should_receive('is_pkg_installed').with_args('foo').\
+            and_return('foo-1.0')
+        flexmock(PackageManager).should_receive('is_pkg_installed').with_args('bar').\
+            and_return(False)
+        assert PackageManager.are_pkgs_installed(['foo', 'bar']) == {'foo': 'foo-1.0',
+                                                                     'bar': False}
+
+
+class TestYUMPackageManager(object):
+    def setup_method(self, method):
+        self.ypm = YUMPackageManager
+
+    def test_rpm_q_all_cl_runs_one_command(self):
+        out = 'foo-1.0-1.fc20.noarch\nno package provides bar\nbaz-2.0-1.fc20.x86_64'
+        flexmock(ClHelper).should_receive('run_command').\
+            with_args('rpm -q --whatprovides "foo" "bar" "baz"').\
+            and_raise(ClException('rpm', 1, out)).once()
+        assert self.ypm._rpm_q_all_cl(['foo', 'bar', 'baz']) == \
+            {'foo': 'foo-1.0-1.fc20.noarch', 'bar': False, 'baz': 'baz-2.0-1.fc20.x86_64'}
+
+    def test_rpm_q_all_cl_all_installed(self):
+        flexmock(ClHelper).should_receive('run_command').and_return('foo-1.0-1.fc20.noarch')
+        assert self.ypm._rpm_q_all_cl(['foo']) == {'foo': 'foo-1.0-1.fc20.noarch'}
+
+    def test_rpm_q_all_cl_more_providers(self):
+        flexmock(ClHelper).should_receive('run_command').\
+            with_args('rpm -q --whatprovides "foo" "bar"').\
+            and_return('foo-1.0-1.fc20.noarch\nbar-1.0-1.fc20.noarch\nbar2-1.0-1.fc20.noarch')
+        flexmock(self.ypm).should_receive('rpm_q').with_args('foo').\
+            and_return('foo-1.0-1.fc20.noarch')
+        flexmock(self.ypm).should_receive('rpm_q').with_args('bar').\
+            and_return('bar-1.0-1.fc20.noarch\nbar2-1.0-1.fc20.noarch')
+        assert self.ypm._rpm_q_all_cl(['foo', 'bar']) == \
+            {'foo': 'foo-1.0-1.fc20.noarch', 'bar': 'bar-1.0-1.fc20.noarch\nbar2-1.0-1.fc20.noarch'}
+
+    def test_rpm_q_all_cl_untrusted_failure(self):
+        flexmock(ClHelper).should_receive('run_command').\
+            and_raise(ClException('rpm', 127, 'rpm: command not found'))
+        assert self.ypm._rpm_q_all_cl(['foo', 'bar']) == {'foo': False, 'bar': False}
+
+    def test_are_pkgs_installed_splits_groups_and_rpms(self):
+        flexmock(self.ypm).should_receive('installed_groups').with_args(['@grp']).\
+            and_return({'@grp': '@grp'})
+        flexmock(self.ypm).should_receive('rpm_q_all').with_args(['foo', 'bar']).\
+            and_return({'foo': 'foo-1.0', 'bar': False})
+        assert self.ypm.are_pkgs_installed(['foo', '@grp', 'bar']) == \
+            {'foo': 'foo-1.0', '@grp': '@grp', 'bar': False}
+
+
+class TestYUMResolve(object):
+    def setup_method(self, method):
+        self.ypm = YUMPackageManager
+        self.ypm._resolved = None
+        self.revision = [[['fedora', '1']], [['/var/lib/rpm/Packages', 1.0]]]
+        flexmock(self.ypm).should_receive('_get_metadata_revision').\
+            replace_with(lambda y: self.revision)
+
+    def teardown_method(self, method):
+        self.ypm._resolved = None
+
+    def get_fake_yum_base(self):
+        members = []
+        y = flexmock(tsInfo=flexmock(getMembers=lambda: members),
+                     returnPackageByDep=lambda dep: dep,
+                     resolveDeps=lambda: None)
+        y.install = lambda pkg: members.append(flexmock(po=flexmock(ui_envra=pkg + '-1.0')))
+        return y
+
+    def test_resolved_transaction_is_memoized(self, tmpdir, monkeypatch):
+        monkeypatch.setitem(sys.modules, 'yum', flexmock(Errors=flexmock(YumBaseError=Exception)))
+        monkeypatch.setattr(settings, 'YUM_RESOLVED_FILE', tmpdir.join('resolved.yaml').strpath)
+        flexmock(self.ypm).should_receive('_get_yum_base').\
+            replace_with(self.get_fake_yum_base)
+        y = flexmock(self.get_fake_yum_base())
+        assert self.ypm.resolve('foo', 'bar') == ['foo-1.0', 'bar-1.0']
+        # resolved from memory...
+        flexmock(self.ypm).should_receive('_get_yum_base').and_return(y)
+        y.should_receive('resolveDeps').never()
+        assert self.ypm.resolve('bar', 'foo') == ['foo-1.0', 'bar-1.0']
+        # ... and from file
+        self.ypm._resolved = None
+        assert self.ypm.resolve('bar', 'foo') == ['foo-1.0', 'bar-1.0']
+
+    def test_changed_revision_resolves_again(self, tmpdir, monkeypatch):
+        monkeypatch.setitem(sys.modules, 'yum', flexmock(Errors=flexmock(YumBaseError=Exception)))
+        monkeypatch.setattr(settings, 'YUM_RESOLVED_FILE', tmpdir.join('resolved.yaml').strpath)
+        flexmock(self.ypm).should_receive('_get_yum_base').\
+            replace_with(self.get_fake_yum_base).twice()
+        self.ypm.resolve('foo')
+        self.revision = [[['fedora', '2']], [['/var/lib/rpm/Packages', 1.0]]]
+        self.ypm.resolve('foo')
+
+
+class FakePackage(object):
+    def __init__(self, name, installed=False, provides=[], files=[]):
+        self.name = name
+        self.installed = installed
+        self.provides = [name] + provides
+        self.files = files
+
+    def __str__(self):
+        return self.name + '-1.0-1.fc20.noarch'
+
+
+class FakeQuery(object):
+    def __init__(self, pkgs):
+        self.pkgs = pkgs
+
+    def installed(self):
+        return FakeQuery([p for p in self.pkgs if p.installed])
+
+    def filter(self, name=None, provides=None, file=None):
+        return FakeQuery([p for p in self.pkgs if p.name == name or
+                          provides in p.provides or file in p.files])
+
+    def run(self):
+        return list(self.pkgs)
+
+
+class FakeSack(object):
+    def __init__(self, pkgs):
+        self.pkgs = pkgs
+
+    def query(self):
+        return FakeQuery(self.pkgs)
+
+
+class FakeDNFBase(object):
+    def __init__(self, pkgs, groups={}):
+        self.sack = FakeSack(pkgs)
+        self.groups = groups
+        self.comps = flexmock(group_by_pattern=self.groups.get)
+        self.transaction = flexmock(install_set=[])
+
+    def install(self, pkg):
+        found = self.sack.query().filter(provides=pkg).run()
+        if not found:
+            raise FakeDNFError(pkg)
+        self.transaction.install_set.append(found[0])
+
+    def resolve(self):
+        pass
+
+    def reset(self, goal=False):
+        self.transaction.install_set = []
+
+
+class FakeDNFError(Exception):
+    pass
+
+
+class TestDNFPackageManager(object):
+    def setup_method(self, method):
+        self.dpm = DNFPackageManager
+        grp = flexmock(id='grp', mandatory_packages=[flexmock(name='foo'), flexmock(name='bar')])
+        self.base = FakeDNFBase([FakePackage('foo', installed=True, provides=['libfoo']),
+                                 FakePackage('bar'),
+                                 FakePackage('baz', installed=True, files=['/usr/bin/baz'])],
+                                groups={'grp': grp})
+        self.dpm._base = self.base
+        self.dpm._base_available = True
+
+    def teardown_method(self, method):
+        self.dpm._reset_base()
+
+    def test_are_pkgs_installed_uses_loaded_sack(self):
+        flexmock(ClHelper).should_receive('run_command').never()
+        assert self.dpm.are_pkgs_installed(['foo', 'libfoo', 'bar', '/usr/bin/baz', '@grp']) == \
+            {'foo': 'foo-1.0-1.fc20.noarch',
+             'libfoo': 'foo-1.0-1.fc20.noarch',
+             'bar': False,
+             '/usr/bin/baz': 'baz-1.0-1.fc20.noarch',
+             '@grp': False}
+
+    def test_resolve(self, monkeypatch):
+        monkeypatch.setitem(sys.modules, 'dnf',
+                            flexmock(exceptions=flexmock(Error=FakeDNFError)))
+        assert self.dpm.resolve('bar', 'libfoo') == ['bar-1.0-1.fc20.noarch',
+                                                     'foo-1.0-1.fc20.noarch']
+        # goal was reset, but sack is kept
+        assert self.base.transaction.install_set == []
+        assert self.dpm._base is self.base
+
+    def test_resolve_not_found(self, monkeypatch):
+        monkeypatch.setitem(sys.modules, 'dnf',
+                            flexmock(exceptions=flexmock(Error=FakeDNFError)))
+        with pytest.raises(DependencyException):
+            self.dpm.resolve('spam')
+
+    def test_install_is_single_transaction(self):
+        flexmock(ClHelper).should_receive('run_command').\
+            with_args('pkexec dnf -y install "foo-1.0" "bar-1.0"', ignore_sigint=True).\
+            and_return('').once()
+        assert self.dpm.install('foo-1.0', 'bar-1.0') == ('foo-1.0', 'bar-1.0')
+        assert self.dpm._base is None
+
+
+class TestEmergePackageManager(object):
+    def teardown_method(self, method):
+        EmergePackageManager._trees = None
+
+    def test_trees_are_obtained_once(self, monkeypatch):
+        vardb = flexmock(match=lambda pkg: ['dev-lang/python-3.3'] if 'python' in pkg else [])
+        lookups = []
+
+        class DB(dict):
+            def __getitem__(self, root):
+                lookups.append(root)
+                return dict.__getitem__(self, root)
+
+        portage = flexmock(root='/', exception=flexmock(InvalidAtom=ValueError),
+                           db=DB({'/': {'vartree': flexmock(dbapi=vardb)}}))
+        monkeypatch.setitem(sys.modules, 'portage', portage)
+
+        assert EmergePackageManager.are_pkgs_installed(['dev-lang/python', 'foo']) == \
+            {'dev-lang/python': True, 'foo': False}
+        assert EmergePackageManager.is_pkg_installed('dev-lang/python')
+        assert lookups == ['/']
+
+
+class TestPaludisPackageManager(object):
+    def teardown_method(self, method):
+        PaludisPackageManager._env = None
+
+    def test_env_is_created_once(self, monkeypatch):
+        installed = flexmock(package_ids=lambda name, opts: [name + '-1.0'] if name == 'foo' else [])
+        env = flexmock(fetch_repository=lambda name: installed)
+        factory = flexmock()
+        factory.should_receive('create').with_args('').and_return(env).once()
+        paludis = flexmock(EnvironmentFactory=flexmock(instance=factory),
+                           BaseException=ValueError,
+                           UserPackageDepSpecOptions=lambda: None,
+                           parse_user_package_dep_spec=lambda dep, env, opts: flexmock(package=dep))
+        monkeypatch.setitem(sys.modules, 'paludis', paludis)
+
+        assert PaludisPackageManager.are_pkgs_installed(['foo', 'bar']) == \
+            {'foo': ['foo-1.0'], 'bar': []}
+        assert PaludisPackageManager.is_pkg_installed('foo') == ['foo-1.0']
+
+
+class TestInstalledPackagesIndex(object):
+    def setup_method(self, method):
+        self.fingerprint = [['/foo', 1.0]]
+        flexmock(YUMPackageManager).should_receive('get_db_fingerprint').\
+            replace_with(lambda: self.fingerprint)
+
+    def get_index(self, tmpdir):
+        return InstalledPackagesIndex(os.path.join(tmpdir.strpath, 'dir', 'index.yaml'))
+
+    def test_queries_only_unknown_packages(self, tmpdir):
+        flexmock(YUMPackageManager).should_receive('are_pkgs_installed').with_args(['foo']).\
+            and_return({'foo': 'foo-1.0'}).once()
+        flexmock(YUMPackageManager).should_receive('are_pkgs_installed').with_args(['bar']).\
+            and_return({'bar': False}).once()
+        idx = self.get_index(tmpdir)
+        assert idx.are_pkgs_installed(YUMPackageManager, ['foo']) == {'foo': 'foo-1.0'}
+        assert idx.are_pkgs_installed(YUMPackageManager, ['foo', 'bar']) == \
+            {'foo': 'foo-1.0', 'bar': False}
+
+    def test_persists_between_runs(self, tmpdir):
+        flexmock(YUMPackageManager).should_receive('are_pkgs_installed').\
+            and_return({'foo': 'foo-1.0'}).once()
+        self.get_index(tmpdir).are_pkgs_installed(YUMPackageManager, ['foo'])
+        # a fresh index loads the results from file and doesn't query again
+        assert self.get_index(tmpdir).are_pkgs_installed(YUMPackageManager, ['foo']) == \
+            {'foo': 'foo-1.0'}
+
+    def test_changed_fingerprint_invalidates(self, tmpdir):
+        flexmock(YUMPackageManager).should_receive('are_pkgs_installed').\
+            and_return({'foo': False}).and_return({'foo': 'foo-1.0'}).twice()
+        idx = self.get_index(tmpdir)
+        assert idx.are_pkgs_installed(YUMPackageManager, ['foo']) == {'foo': False}
+        self.fingerprint = [['/foo', 2.0]]
+        assert idx.are_pkgs_installed(YUMPackageManager, ['foo']) == {'foo': 'foo-1.0'}
+
+    def test_no_fingerprint_always_queries(self, tmpdir):
+        self.fingerprint = None
+        flexmock(YUMPackageManager).should_receive('are_pkgs_installed').\
+            and_return({'foo': 'foo-1.0'}).twice()
+        idx = self.get_index(tmpdir)
+        idx.are_pkgs_installed(YUMPackageManager, ['foo'])
+        idx.are_pkgs_installed(YUMPackageManager, ['foo'])
+        assert not os.path.exists(idx.index_file)
+
+
+class TestDependencyPlan(object):
+    def test_dedupes_in_first_seen_order(self):
+        plan = DependencyPlan()
+        plan.add('rpm', ['foo', 'bar'])
+        plan.add('pip', ['spam'])
+        plan.add('rpm', ['bar ', 'baz', 'foo'])
+        assert plan.get_plan() == collections.OrderedDict([('rpm', ['foo', 'bar', 'baz']),
+                                                           ('pip', ['spam'])])
+
+    def test_merges_pip_constraints(self):
+        plan = DependencyPlan()
+        plan.add('pip', ['Foo_Bar[a]>=1.0', 'foo-bar[b] <2, >=1.0', 'foo.bar'])
+        assert plan.get_plan()['pip'] == ['Foo_Bar[a,b]>=1.0,<2']
+
+    @pytest.mark.parametrize('deps', [
+        ['git+https://github.com/a/x.git', 'git+https://github.com/b/y.git'],
+        ['foo; python_version<"3"', 'foo>=1'],
+        ['foo @ https://example.com/foo.whl', 'foo<2']])
+    def test_doesnt_merge_pip_urls_and_markers(self, deps):
+        plan = DependencyPlan()
+        plan.add('pip', deps)
+        assert plan.get_plan()['pip'] == deps
+
+    @pytest.mark.parametrize(('deps', 'merged'), [
+        (['foo@>=1.0', 'foo@<2'], 'foo@>=1.0 <2'),
+        (['foo', 'foo@^1.0'], 'foo@^1.0'),
+        (['foo@latest', 'foo@^1.0'], 'foo@latest'),
+        (['@scope/foo@1 || 2', '@scope/foo@<2'], '@scope/foo@1 || 2'),
+    ])
+    def test_merges_npm_constraints(self, deps, merged):
+        plan = DependencyPlan()
+        plan.add('npm', deps)
+        assert plan.get_plan()['npm'] == [merged]
+
+    def test_distro_dependencies_added_once(self):
+        di = DependencyInstaller()
+        flexmock(di).should_receive('get_system_deptype_shortcut').and_return('rpm')
+        flexmock(utils).should_receive('get_distro_name').and_return('fedora')
+        for dep in [{'pip': ['foo']}, {'pip': ['bar', 'foo']}, {'rpm': ['python-pip']}]:
+            for dep_t, dep_l in dep.items():
+                di._process_dependency(dep_t, dep_l)
+        assert di.dependencies == collections.OrderedDict([('rpm', ['python-pip']),
+                                                           ('pip', ['foo', 'bar'])])
+
+
+class TestDependencyInstaller(object):
+    def setup_method(self, method):
+        self.di = DependencyInstaller()
+        self.di.installed_index = flexmock(are_pkgs_installed=lambda mgr, pkgs:
+                                           dict([(p, p.startswith('inst')) for p in pkgs]))
+        self.di.plan.add('rpm', ['inst-foo', 'bar'])
+        self.di.plan.add('pip', ['spam', 'inst-eggs'])
+        flexmock(YUMPackageManager).should_receive('resolve').replace_with(lambda *a: list(a))
+        flexmock(PIPPackageManager).should_receive('resolve').replace_with(lambda *a: list(a))
+
+    def test_one_confirmation_and_system_deps_first(self):
+        flexmock(self.di).should_receive('get_package_manager').with_args('rpm').\
+            and_return(YUMPackageManager)
+        flexmock(self.di).should_receive('get_package_manager').with_args('pip').\
+            and_return(PIPPackageManager)
+        flexmock(DialogHelper).should_receive('ask_for_package_list_confirm').\
+            with_args(prompt='Installing 2 packages (1 rpm, 1 pip). Is this ok?',
+                      package_list=['bar', 'spam']).and_return(True).once()
+        installed = []
+        flexmock(YUMPackageManager).should_receive('prefetch').never()
+        flexmock(PIPPackageManager).should_receive('prefetch').with_args('spam').\
+            replace_with(lambda *a: installed.append('prefetched')).once()
+        flexmock(YUMPackageManager).should_receive('install').\
+            replace_with(lambda *a: installed.extend(a) or a)
+        flexmock(PIPPackageManager).should_receive('install').\
+            replace_with(lambda *a: installed.extend(a) or a)
+
+        self.di._install_dependencies()
+        assert installed.index('prefetched') < installed.index('spam')
+        assert [p for p in installed if p != 'prefetched'] == ['bar', 'spam']
+
+    def test_failed_prefetch_is_ignored(self):
+        flexmock(self.di).should_receive('get_package_manager').with_args('rpm').\
+            and_return(YUMPackageManager)
+        flexmock(self.di).should_receive('get_package_manager').with_args('pip').\
+            and_return(PIPPackageManager)
+        flexmock(DialogHelper).should_receive('ask_for_package_list_confirm').and_return(True)
+        flexmock(PIPPackageManager).should_receive('prefetch').and_raise(ValueError)
+        flexmock(YUMPackageManager).should_receive('install').replace_with(lambda *a: a)
+        flexmock(PIPPackageManager).should_receive('install').replace_with(lambda *a: a).once()
+
+        self.di._install_dependencies()
+
+    def test_prefetched_packages_discarded_when_install_fails(self):
+        flexmock(self.di).should_receive('get_package_manager').with_args('rpm').\
+            and_return(YUMPackageManager)
+        flexmock(self.di).should_receive('get_package_manager').with_args('pip').\
+            and_return(PIPPackageManager)
+        flexmock(DialogHelper).should_receive('ask_for_package_list_confirm').and_return(True)
+        flexmock(PIPPackageManager).should_receive('prefetch').once()
+        flexmock(YUMPackageManager).should_receive('install').and_return(False)
+        flexmock(PIPPackageManager).should_receive('install').never()
+        flexmock(PIPPackageManager).should_receive('discard_prefetched').once()
+
+        with pytest.raises(DependencyException):
+            self.di._install_dependencies()
+
+    def test_prefetch_finished_after_cancel_is_discarded(self):
+        event = threading.Event()
+        flexmock(PIPPackageManager).should_receive('prefetch').replace_with(lambda *a: event.wait())
+        flexmock(PIPPackageManager).should_receive('discard_prefetched').once()
+        thread = PrefetchThread(PIPPackageManager, ['spam'])
+        thread.start()
+        thread.cancel()
+        event.set()
+        thread.join()
+
+    def test_denied_installs_nothing(self):
+        flexmock(self.di).should_receive('get_package_manager').with_args('rpm').\
+            and_return(YUMPackageManager)
+        flexmock(self.di).should_receive('get_package_manager').with_args('pip').\
+            and_return(PIPPackageManager)
+        flexmock(DialogHelper).should_receive('ask_for_package_list_confirm').and_return(False)
+        flexmock(YUMPackageManager).should_receive('install').never()
+        flexmock(PIPPackageManager).should_receive('install').never()
+
+        with pytest.raises(DependencyException):
+            self.di._install_dependencies()
+
+    def test_check_failure_is_raised(self):
+        self.di.installed_index = flexmock()
+        self.di.installed_index.should_receive('are_pkgs_installed').\
+            and_raise(ClException('rpm', 1, 'error'))
+        with pytest.raises(ClException):
+            self.di._check_installed({'rpm': YUMPackageManager, 'pip': PIPPackageManager})
+
+    def test_not_working_nonsystem_manager_is_deferred(self):
+        flexmock(self.di).should_receive('get_package_manager').with_args('rpm').\
+            and_return(YUMPackageManager)
+        flexmock(self.di).should_receive('get_package_manager').with_args('pip').\
+            and_raise(NoPackageManagerOperationalException('pip not working')).\
+            and_return(PIPPackageManager).twice()
+        flexmock(DialogHelper).should_receive('ask_for_package_list_confirm').\
+            and_return(True).twice()
+        flexmock(YUMPackageManager).should_receive('install').and_return(['bar']).\
+            once().ordered()
+        flexmock(PIPPackageManager).should_receive('install').and_return(['spam']).\
+            once().ordered()
+
+        self.di._install_dependencies()
+
+
+class TestPacmanPackageManager(object):
+    def teardown_method(self, method):
+        PacmanPackageManager._local_db = None
+
+    def test_reads_local_db_once(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(PacmanPackageManager, 'local_db_dir', tmpdir.strpath)
+        tmpdir.mkdir('gcc-4.8.2-7').join('desc').write(
+            '%NAME%\ngcc\n\n%VERSION%\n4.8.2-7\n\n%GROUPS%\nbase-devel\n\n')
+        tmpdir.mkdir('python-3.3.3-1').join('desc').write('%NAME%\npython\n\n%VERSION%\n3.3.3-1\n')
+        tmpdir.mkdir('ALPM_DB_VERSION')
+        flexmock(ClHelper).should_receive('run_command').never()
+        assert PacmanPackageManager.are_pkgs_installed(['gcc', 'python', 'base-devel', 'foo']) == \
+            {'gcc': 'gcc 4.8.2-7', 'python': 'python 3.3.3-1', 'base-devel': 'base-devel',
+             'foo': False}
+        tmpdir.mkdir('foo-1.0-1').join('desc').write('%NAME%\nfoo\n\n%VERSION%\n1.0-1\n')
+        assert PacmanPackageManager.is_pkg_installed('foo') is False
+
+    def test_queries_pacman_without_local_db(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(PacmanPackageManager, 'local_db_dir', tmpdir.join('nope').strpath)
+        flexmock(ClHelper).should_receive('run_command').with_args('pacman -Q').\
+            and_return('gcc 4.8.2-7\npython 3.3.3-1').once()
+        flexmock(ClHelper).should_receive('run_command').with_args('pacman -Qg').\
+            and_return('base-devel gcc').once()
+        assert PacmanPackageManager.are_pkgs_installed(['gcc', 'base-devel', 'base']) == \
+            {'gcc': 'gcc 4.8.2-7', 'base-devel': 'base-devel', 'base': False}
+        assert PacmanPackageManager.is_pkg_installed('python') == 'python 3.3.3-1'
+
+
+class TestPIPPackageManager(object):
+    def setup_method(self, method):
+        self.ppm = PIPPackageManager
+        self.ppm._installed = {'django': '1.6.1', 'foo-bar': '2.0b1'}
+
+    def teardown_method(self, method):
+        self.ppm._installed = None
+
+    @pytest.mark.parametrize(('name', 'normalized'), [
+        ('Django', 'django'),
+        ('foo_bar', 'foo-bar'),
+        ('Foo.-_Bar', 'foo-bar')])
+    def test_normalize_name(self, name, normalized):
+        assert self.ppm.normalize_name(name) == normalized
+
+    @pytest.mark.parametrize(('dep', 'found'), [
+        ('django', 'django 1.6.1'),
+        ('Django>=1.5', 'Django 1.6.1'),
+        ('Django >= 1.5, < 2', 'Django 1.6.1'),
+        ('Foo_Bar[baz]', 'Foo_Bar 2.0b1'),
+        ('Django>=1.7', False),
+        ('spam', False),
+        ('git+https://github.com/foo/bar.git', False)])
+    def test_find_installed(self, dep, found):
+        assert self.ppm.find_installed(dep) == found
+
+    def test_site_paths_include_nonexistent_user_site(self, tmpdir):
+        user_site = tmpdir.join('site-packages')
+        self.ppm._site_paths = None
+        flexmock(self.ppm).should_receive('get_pip_interpreter').and_return(sys.executable)
+        flexmock(site).should_receive('getusersitepackages').and_return(user_site.strpath)
+        try:
+            assert self.ppm.get_site_paths()[-1] == user_site.strpath
+            assert [user_site.strpath, None] in self.ppm.get_db_fingerprint()
+        finally:
+            self.ppm._site_paths = None
+
+    def test_install_resets_site_paths(self):
+        self.ppm._site_paths = ['/foo']
+        flexmock(self.ppm).should_receive('get_mirror').and_return(None)
+        flexmock(self.ppm).should_receive('_run_install').and_return(True)
+        assert self.ppm.install('foo') == ('foo', )
+        assert self.ppm._site_paths is None
+
+    def test_load_installed_from_metadata(self):
+        # the running interpreter surely has pytest installed
+        flexmock(self.ppm).should_receive('get_site_paths').and_return(sys.path)
+        flexmock(ClHelper).should_receive('run_command').never()
+        installed = self.ppm._load_installed()
+        assert installed['pytest'] == pytest.__version__
+
+    def test_install_invalidates_index(self):
+        flexmock(ClHelper).should_receive('run_command').and_return('')
+        self.ppm.install('spam')
+        assert self.ppm._installed is None
+
+    def test_install_uses_prefetched(self):
+        cmds = []
+        flexmock(ClHelper).should_receive('run_command').replace_with(
+            lambda cmd, **kwargs: cmds.append(cmd) or '')
+        self.ppm.prefetch('spam')
+        prefetch_dir = self.ppm._prefetch_dir
+        assert os.path.isdir(prefetch_dir)
+        self.ppm.install('spam')
+        assert cmds == ['pip download -d "{0}" "spam"'.format(prefetch_dir),
+                        'pip install --user --find-links "{0}" "spam"'.format(prefetch_dir)]
+        assert not os.path.exists(prefetch_dir)
+        assert self.ppm._prefetch_dir is None
+
+    def test_install_from_mirror(self, tmpdir, monkeypatch):
+        mirror = tmpdir.join('wheelhouse').strpath
+        monkeypatch.setattr(settings, 'PIP_MIRROR_DIR', mirror)
+        flexmock(ClHelper).should_receive('run_command').\
+            with_args('pip install --user --no-index --find-links "{0}" "spam"'.format(mirror),
+                      ignore_sigint=True).and_return('').once()
+        assert self.ppm.install('spam') == ('spam', )
+        assert os.path.isdir(mirror)
+
+    def test_install_without_unusable_mirror(self, tmpdir, monkeypatch):
+        # the mirror can't be created, since its parent is a file
+        tmpdir.join('file').write('')
+        monkeypatch.setattr(settings, 'PIP_MIRROR_DIR', tmpdir.join('file', 'wheelhouse').strpath)
+        flexmock(ClHelper).should_receive('run_command').\
+            with_args('pip install --user "spam"', ignore_sigint=True).and_return('').once()
+        assert self.ppm.install('spam') == ('spam', )
+
+    def test_install_fills_mirror(self, tmpdir, monkeypatch):
+        mirror = tmpdir.strpath
+        monkeypatch.setattr(settings, 'PIP_MIRROR_DIR', mirror)
+        cmds = []
+
+        def run_command(cmd, **kwargs):
+            cmds.append(cmd)
+            if len(cmds) == 1:
+                raise ClException(cmd, 1, 'No matching distribution found for spam')
+            return ''
+
+        flexmock(ClHelper).should_receive('run_command').replace_with(run_command)
+        assert self.ppm.install('spam') == ('spam', )
+        offline = 'pip install --user --no-index --find-links "{0}" "spam"'.format(mirror)
+        assert cmds == [offline,
+                        'pip wheel --wheel-dir "{0}" --find-links "{0}" "spam"'.format(mirror),
+                        offline]
+
+
+class TestNPMPackageManager(object):
+    def setup_method(self, method):
+        self.npm = NPMPackageManager
+        self.npm._installed = {}
+
+    def teardown_method(self, method):
+        self.npm._installed = {}
+
+    @pytest.mark.parametrize(('dep', 'split'), [
+        ('foo', ('foo', '')),
+        ('foo@1.0', ('foo', '1.0')),
+        ('@scope/foo', ('@scope/foo', '')),
+        ('@scope/foo@^1.0', ('@scope/foo', '^1.0'))])
+    def test_split_dep(self, dep, split):
+        assert self.npm.split_dep(dep) == split
+
+    def test_project_dir_is_closest_with_package_json(self, tmpdir):
+        tmpdir.join('package.json').write('{}')
+        subdir = tmpdir.mkdir('lib').mkdir('sub')
+        with subdir.as_cwd():
+            assert self.npm.get_project_dir() == tmpdir.strpath
+
+    def test_index_is_per_project(self, tmpdir):
+        out = 'npm WARN something\n{"dependencies": {"foo": {"version": "1.0.0"},\n' + \
+            '"bar": {"required": "^2.0", "missing": true}}}\nnpm ERR! missing: bar@^2.0'
+        flexmock(ClHelper).should_receive('run_command').with_args('npm ls --json --depth=0').\
+            and_raise(ClException('npm', 1, out)).twice()
+        p1 = tmpdir.mkdir('p1')
+        p1.join('package.json').write('{}')
+        p2 = tmpdir.mkdir('p2')
+        p2.join('package.json').write('{}')
+        with p1.as_cwd():
+            assert self.npm.find_installed('foo@^1.0') == 'foo@1.0.0'
+            assert self.npm.find_installed('bar') is False
+        with p2.as_cwd():
+            assert self.npm.find_installed('foo') == 'foo@1.0.0'
+
+    def test_install_uses_mirror(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(settings, 'NPM_MIRROR_DIR', tmpdir.strpath)
+        flexmock(ClHelper).should_receive('run_command').\
+            with_args('npm install --cache "{0}" --prefer-offline "foo@^1.0"'.\
+                      format(tmpdir.strpath), ignore_sigint=True).and_return('').once()
+        with tmpdir.as_cwd():
+            assert self.npm.install('foo@^1.0') == ('foo@^1.0', )
+
+
+class TestManagerProbes(object):
+    def get_probes(self, tmpdir, ttl=600):
+        return ManagerProbes(os.path.join(tmpdir.strpath, 'probes.yaml'), ttl=ttl)
+
+    def test_probes_once_per_invocation(self, tmpdir):
+        flexmock(PIPPackageManager).should_receive('works').and_return(False).once()
+        probes = self.get_probes(tmpdir)
+        assert probes.works(PIPPackageManager) is False
+        assert probes.works(PIPPackageManager) is False
+
+    def test_working_manager_is_stored(self, tmpdir):
+        flexmock(PIPPackageManager).should_receive('works').and_return(True).once()
+        self.get_probes(tmpdir).works(PIPPackageManager)
+        assert self.get_probes(tmpdir).works(PIPPackageManager) is True
+
+    def test_not_working_manager_is_not_stored(self, tmpdir):
+        flexmock(PIPPackageManager).should_receive('works').and_return(False).\
+            and_return(True).twice()
+        assert self.get_probes(tmpdir).works(PIPPackageManager) is False
+        assert self.get_probes(tmpdir).works(PIPPackageManager) is True
+
+    def test_stored_probe_is_specific_to_interpreter_and_path(self, tmpdir, monkeypatch):
+        flexmock(PIPPackageManager).should_receive('works').and_return(True).times(3)
+        self.get_probes(tmpdir).works(PIPPackageManager)
+        monkeypatch.setattr(sys, 'executable', '/usr/bin/python2')
+        self.get_probes(tmpdir).works(PIPPackageManager)
+        monkeypatch.setenv('PATH', '/nonexistent')
+        self.get_probes(tmpdir).works(PIPPackageManager)
+        # all of these are stored now
+        assert self.get_probes(tmpdir).works(PIPPackageManager) is True
+
+    def test_old_probes_file_format_is_ignored(self, tmpdir):
+        tmpdir.join('probes.yaml').write('PIPPackageManager: 1388530800.0\n')
+        flexmock(PIPPackageManager).should_receive('works').and_return(True).once()
+        assert self.get_probes(tmpdir).works(PIPPackageManager) is True
+
+    def test_stored_probe_expires(self, tmpdir):
+        flexmock(PIPPackageManager).should_receive('works').and_return(True).twice()
+        self.get_probes(tmpdir, ttl=0).works(PIPPackageManager)
+        self.get_probes(tmpdir, ttl=0).works(PIPPackageManager)
+
+    def test_forget(self, tmpdir):
+        flexmock(PIPPackageManager).should_receive('works').and_return(False).\
+            and_return(True).twice()
+        probes = self.get_probes(tmpdir)
+        assert probes.works(PIPPackageManager) is False
+        probes.forget()
+        assert probes.works(PIPPackageManager) is True
+
+    def test_binary_lookup_doesnt_fork(self):
+        flexmock(ClHelper).should_receive('run_command').never()
+        flexmock(utils).should_receive('which').with_args('npm').and_return(None).once()
+        assert NPMPackageManager.works() is False
@@ -3,6 +3,7 @@ import os
 
 from flexmock import flexmock
 import pytest
+import yaml
 
 from devassistant import exceptions
 from devassistant import settings
@@ -38,15 +39,49 @@ class TestYamlAssistant(object):
 
     def test_dependencies_uses_non_default_section_on_param(self):
         self.ya._dependencies = [{'rpm': ['foo']}]
-        self.ya._dependencies_a = [{'rpm': ['bar']}]
+        self.ya._set_section('dependencies_a', [{'rpm': ['bar']}])
         assert self.ya._dependencies[0] in self.ya.dependencies(kwargs={'a': True})
-        assert self.ya._dependencies_a[0] in self.ya.dependencies(kwargs={'a': True})
+        assert self.ya.get_section('dependencies_a')[0] in self.ya.dependencies(kwargs={'a': True})
 
     def test_dependencies_does_not_use_non_default_section_when_param_not_present(self):
         self.ya._dependencies = [{'rpm': ['foo']}]
-        self.ya._dependencies_a = [{'rpm': ['bar']}]
+        self.ya._set_section('dependencies_a', [{'rpm': ['bar']}])
         assert self.ya.dependencies() == self.ya._dependencies
 
+    def test_sections_indexed_from_parsed_yaml(self):
+        ya = yaml_assistant.YamlAssistant('ya', {'run': [{'cl': 'ls'}],
+                                                 'run_foo': [{'cl': 'id'}],
+                                                 'dependencies_a': [{'rpm': ['bar']}],
+                                                 'description': 'not a section'},
+                                          '', None)
+        assert ya.get_section('run_foo') == [{'cl': 'id'}]
+        assert ya.get_section('dependencies') == []
+        assert ya.get_section('description') is None
+        assert ya.get_section('dependencies_b') is None
+        assert ya.dependencies(kwargs=dict([(str(i), i) for i in range(100)] + [('a', 1)])) == \
+            [{'rpm': ['bar']}]
+
+    def test_not_fully_loaded_assistant_parses_only_used_sections(self, tmpdir):
+        f = tmpdir.join('ya.yaml')
+        f.write('ya:\n  dependencies:\n  - rpm: [foo]\n  dependencies_a:\n  - rpm: [bar]\n'
+                '  run:\n  - cl: ls\n')
+        ya = yaml_assistant.YamlAssistant('ya', {}, f.strpath, None, fully_loaded=False)
+        assert ya.dependencies() == [{'rpm': ['foo']}]
+        assert ya._lazy_sections == set(['dependencies_a', 'run'])
+        assert ya.dependencies(kwargs={'a': True}) == [{'rpm': ['foo']}, {'rpm': ['bar']}]
+        assert ya._lazy_sections == set(['run'])
+        assert ya.get_section('run') == [{'cl': 'ls'}]
+
+    def test_not_fully_loaded_assistant_parsed_yaml_is_dict(self, tmpdir):
+        f = tmpdir.join('ya.yaml')
+        f.write('ya:\n  dependencies:\n  - rpm: [foo]\n  run:\n  - cl: ls\n')
+        ya = yaml_assistant.YamlAssistant('ya', {}, f.strpath, None, fully_loaded=False)
+        ya.assert_fully_loaded()
+        assert type(ya.parsed_yaml) == dict
+        assert yaml.safe_load(yaml.dump(ya.parsed_yaml)) == \
+            {'dependencies': [{'rpm': ['foo']}], 'run': [{'cl': 'ls'}]}
+        assert ya.get_section('run') == [{'cl': 'ls'}]
+
     def test_dependencies_if(self):
         self.ya._dependencies = [{'if $x': [{'rpm': ['foo']}]}, {'else': [{'rpm': ['bar']}]}]
         assert self.ya.dependencies(kwargs={'x': 'x'}) == [{'rpm': ['foo']}]
@@ -340,8 +375,8 @@ class TestYamlAssistantModifier(object):
     def test_dependencies_install_dependencies_for_subassistant_path(self):
         flexmock(self.ya).should_receive('proper_kwargs').and_return(self.dda)
         self.ya._dependencies = [{'rpm': ['spam']}]
-        self.ya._dependencies_foo = [{'rpm': ['beans']}]
-        self.ya._dependencies_foo_bar_baz = [{'rpm': ['eggs']}]
+        self.ya._set_section('dependencies_foo', [{'rpm': ['beans']}])
+        self.ya._set_section('dependencies_foo_bar_baz', [{'rpm': ['eggs']}])
         deps = self.ya.dependencies(kwargs=self.dda)
         assert {'rpm': ['spam']} in deps
         assert {'rpm': ['beans']} in deps
@@ -350,7 +385,7 @@ class TestYamlAssistantModifier(object):
     def test_run_chooses_proper_method(self):
         flexmock(self.ya).should_receive('proper_kwargs').and_return(self.dda)
         self.ya._run = [{'log_i': 'wrong!'}]
-        self.ya._run_foo = [{'log_i': 'wrong too!'}]
-        self.ya._run_foo_bar_baz = [{'log_i': 'correct'}]
+        self.ya._set_section('run_foo', [{'log_i': 'wrong too!'}])
+        self.ya._set_section('run_foo_bar_baz', [{'log_i': 'correct'}])
         self.ya.run(kwargs=self.dda)
         assert ('INFO', 'correct') in self.tlh.msgs
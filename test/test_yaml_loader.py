@@ -19,3 +19,26 @@ class TestYamlLoader(object):
                 format(s=self.bad_syntax)
         assert YamlLoader.load_yaml_by_path(self.bad_syntax) == None
         assert ('WARNING', e) in self.tlh.msgs
+
+    def test_load_yaml_lazily_by_path(self, tmpdir):
+        f = tmpdir.join('a.yaml')
+        f.write('a:\n  fullname: A\n  # comment\n  run:\n  - cl: ls\n  - log_i: |\n      multi\n'
+                '      line\n  run_foo: [a, b]\n  dependencies:\n    - rpm: [x]\n')
+        name, loaded = YamlLoader.load_yaml_lazily_by_path(f.strpath)
+        assert name == 'a'
+        assert sorted(loaded.keys()) == ['dependencies', 'fullname', 'run', 'run_foo']
+        assert loaded._loaded == {}
+        assert loaded['run_foo'] == ['a', 'b']
+        assert list(loaded._loaded.keys()) == ['run_foo']
+        assert dict(loaded.items()) == YamlLoader.load_yaml_by_path(f.strpath)['a']
+        assert loaded.get('nope') is None
+
+    def test_load_yaml_lazily_by_path_returns_None_if_not_possible(self, tmpdir):
+        f = tmpdir.join('a.yaml')
+        for content in ['a: {run: []}', # flow style
+                        'a:\n  dependencies: &deps [foo]\n  run: *deps', # alias
+                        'a:\n  run: []\nb:\n  run: []', # more top level items
+                        '[a]']:
+            f.write(content)
+            assert YamlLoader.load_yaml_lazily_by_path(f.strpath) is None
+        assert YamlLoader.load_yaml_lazily_by_path(self.bad_syntax) is None
@@ -1,7 +1,10 @@
+import copy
 import os
 
 import pytest
+from flexmock import flexmock
 
+from devassistant import exceptions
 from devassistant.yaml_snippet_loader import YamlSnippetLoader
 
 class TestYamlSnippetLoader(object):
@@ -20,3 +23,58 @@ class TestYamlSnippetLoader(object):
         s = self.yl.get_snippet_by_name('snippet2')
         assert s.name == 'snippet2'
         assert s.get_run_section() == [{'log_i': 'this is snippet2!'}]
+
+    def test_get_snippet_by_name_nonexistent(self):
+        with pytest.raises(exceptions.SnippetNotFoundException):
+            self.yl.get_snippet_by_name('nonexistent')
+        assert 'nonexistent' in self.yl._missing
+
+    def test_snippets_dirs_scanned_once(self):
+        flexmock(os).should_call('walk').once()
+        self.yl._index = None
+        self.yl.get_snippet_by_name('snippet1')
+        self.yl.get_snippet_by_name('snippet2')
+        with pytest.raises(exceptions.SnippetNotFoundException):
+            self.yl.get_snippet_by_name('nonexistent')
+        # negative entry is only rechecked by looking at mtimes of snippets_dirs
+        with pytest.raises(exceptions.SnippetNotFoundException):
+            self.yl.get_snippet_by_name('nonexistent')
+
+    def test_earlier_snippets_dir_wins(self, tmpdir):
+        tmpdir.mkdir('sub').join('snippet1.yaml').write('run: [{cl: ls}]')
+        self.yl.snippets_dirs = [tmpdir.strpath] + self.yl.snippets_dirs
+        assert self.yl.get_snippet_by_name('snippet1').path == \
+            os.path.join(os.path.dirname(__file__), 'fixtures', 'snippets', 'snippet1.yaml')
+        assert self.yl.get_snippet_by_name('sub/snippet1').get_run_section() == [{'cl': 'ls'}]
+
+    def test_added_snippet_invalidates_missing(self, tmpdir):
+        self.yl.snippets_dirs = [tmpdir.strpath]
+        with pytest.raises(exceptions.SnippetNotFoundException):
+            self.yl.get_snippet_by_name('new')
+        tmpdir.join('new.yaml').write('run: []')
+        os.utime(tmpdir.strpath, (0, 0))
+        assert self.yl.get_snippet_by_name('new').name == 'new'
+        assert 'new' not in self.yl._missing
+
+    def test_snippet_sections_are_shared_and_read_only(self):
+        s = self.yl.get_snippet_by_name('snippet1')
+        assert s.get_run_section() is s.get_run_section()
+        assert isinstance(s.get_run_section(), list)
+        with pytest.raises(TypeError):
+            s.get_run_section().append({'cl': 'ls'})
+        with pytest.raises(TypeError):
+            s.args['some_arg']['flags'] = []
+        # copies are mutable
+        run = copy.deepcopy(s.get_run_section())
+        run[0]['log_i'] = 'changed'
+        assert type(run) == list and type(run[0]) == dict
+        assert s.get_run_section() == [{'log_i': 'this is snippet1!'}]
+
+    def test_get_arg_by_name_returns_mutable_copy(self):
+        s = self.yl.get_snippet_by_name('snippet1')
+        arg = s.get_arg_by_name('some_arg')
+        arg['flags'].append('-x')
+        arg.update({'help': 'foo'})
+        assert type(arg['flags']) == list
+        assert s.get_arg_by_name('some_arg') == {'flags': ['-s', '--some-arg']}
+        assert s.get_arg_by_name('nonexistent') == {}